@@ -0,0 +1,40 @@
+"""Measures the memory taken per search.Node, against an equivalent node
+class that keeps its attributes in a per-instance __dict__ (as Node did
+before it used __slots__).
+
+    $ python3 bench_nodes.py [number of nodes]
+"""
+
+import sys
+import tracemalloc
+
+from search import Node
+
+
+class DictNode(Node):
+    """A Node subclass without __slots__, so instances get a __dict__."""
+
+
+def bytes_per_node(node_class, count):
+    """Builds a chain of count nodes, each with an f value as set by
+    best_first_graph_search, and returns the memory allocated per node."""
+    tracemalloc.start()
+    node = node_class(0)
+    for i in range(1, count):
+        node = node_class(i, node, i, i)
+        node.f = i
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size / count
+
+
+def main(count=100000):
+    slotted = bytes_per_node(Node, count)
+    with_dict = bytes_per_node(DictNode, count)
+    print('Node (__slots__): {:.1f} bytes per node'.format(slotted))
+    print('Node (__dict__):  {:.1f} bytes per node'.format(with_dict))
+    print('reduction:        {:.1f}%'.format(100 * (1 - slotted / with_dict)))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -1 +1,270 @@
-from random import *
+"""Generates random Takuzu instances with a unique solution, for tests and
+load benchmarks.
+
+A full board is first built from a regular pattern that satisfies every
+rule. It is then shuffled by emptying random blocks of it and filling them
+again with the solver, which tries values in random order, so the board
+stays valid at every step.
+
+The instance starts with just enough of its cells, given in random order,
+for propagation alone to fill in the rest, which is cheap to track as cells
+are added. Its clues are then emptied in random order: an emptied clue
+stays empty only if the solver proves that its other value leads to no
+solution, so the instance keeps a unique solution all along. Proofs that
+would take more than --max-nodes search nodes are given up on, and the
+clue is kept.
+
+Difficulty is measured as the search nodes depth_first_inplace_search needs
+to solve an instance, and as the propagation depth: how many rounds of
+filling every forced cell at once it takes before propagation alone is
+done (see difficulty). With --nodes or --depth, only as many cells are
+emptied as needed to reach that difficulty.
+
+    $ python3 random_takuzu.py 10
+    $ python3 random_takuzu.py 50 --count 10 --seed 1 --output big.txt
+    $ python3 random_takuzu.py 20 --count 1000 --nodes 10 --corpus bench.tkc
+"""
+
+import argparse
+import random
+import sys
+import time
+
+from takuzu import BitBoard, Takuzu, depth_first_inplace_search, format_cells, settle_in_place
+from takuzu_corpus import write_corpus
+
+
+def pairs(bits):
+    """Expands each bit b into the pair b, 1 - b."""
+    return [cell for bit in bits for cell in (bit, 1 - bit)]
+
+
+def distinct(lines):
+    """Tells whether no two lines are equal or the complement of each other."""
+    seen = set()
+    for line in lines:
+        if tuple(line) in seen:
+            return False
+        seen.add(tuple(line))
+        seen.add(tuple(1 - bit for bit in line))
+    return True
+
+
+def pattern_board(n: int, rng: random.Random):
+    """Returns the rows of a random full board of size n built from pairs:
+    row 2k is a sequence of pairs 01 or 10 and row 2k + 1 is its
+    complement, so every line of the even part is balanced and has no
+    three equal adjacent values. Odd sizes get one more row and column,
+    again made of pairs, and a random corner cell."""
+    m = n // 2
+    while True:
+        choice = [[rng.randrange(2) for _ in range(m)] for _ in range(m)]
+        if not (distinct(choice) and distinct(zip(*choice))):
+            continue
+        rows = []
+        for bits in choice:
+            rows.append(pairs(bits))
+            rows.append([1 - cell for cell in rows[-1]])
+        if n % 2:
+            corner = rng.randrange(2)
+            column = pairs(rng.randrange(2) for _ in range(m)) + [corner]
+            for row, cell in zip(rows, column):
+                row.append(cell)
+            rows.append(pairs(rng.randrange(2) for _ in range(m)) + [corner])
+        if len(set(map(tuple, rows))) == n and len(set(zip(*rows))) == n:
+            return rows
+
+
+def resample(board, rng: random.Random, size: int, max_nodes=None):
+    """Empties a random size x size block of board, a full valid BitBoard,
+    and fills it again with the solver, trying values in random order.
+    Returns the new board, or board itself if the solver gave up."""
+    top = rng.randrange(board.len - size + 1)
+    left = rng.randrange(board.len - size + 1)
+    trial = board.copy()
+    for row in range(top, top + size):
+        for col in range(left, left + size):
+            trial.remove(row, col)
+    goal = depth_first_inplace_search(Takuzu(trial), max_nodes, rng)
+    if goal is None or goal == 'cutoff':
+        return board
+    return goal.state.board
+
+
+def random_solution(n: int, rng: random.Random, rounds=None, size=6):
+    """Returns a random full valid BitBoard of size n: a pattern_board,
+    with rounds random blocks (n * n // 2 by default) of size x size cells
+    resampled by the solver."""
+    if rounds is None:
+        rounds = n * n // 2
+    board = BitBoard.from_rows(pattern_board(n, rng))
+    for _ in range(rounds):
+        board = resample(board, rng, min(size, n), max_nodes=200)
+    return board
+
+
+def has_other_solution(board, row: int, col: int, val: int, max_nodes=None):
+    """Tells whether board, where (row, col) was just emptied and held val
+    in a solution, has a solution with the other value there. Also True
+    when the search needs more than max_nodes nodes to rule it out."""
+    if not board.is_legal(row, col, 1 - val):
+        return False
+    # The search propagates on its own, so the problem does not.
+    problem = Takuzu(board.set_number(row, col, 1 - val), propagation=False, mrv=False)
+    return depth_first_inplace_search(problem, max_nodes) is not None
+
+
+def propagation_depth(board):
+    """Returns the number of rounds it takes to fill the forced cells of
+    board (see propagate), each round filling every cell that is forced at
+    its start."""
+    board = board.copy()
+    depth = 0
+    while True:
+        forced = []
+        for row, col in board.empty_cells():
+            zero = board.is_legal(row, col, 0)
+            one = board.is_legal(row, col, 1)
+            if zero != one:
+                forced.append((row, col, int(one)))
+        if not forced:
+            return depth
+        for cell in forced:
+            board.place(*cell)
+        depth += 1
+
+
+def difficulty(board, max_nodes=None):
+    """Returns (nodes, depth): the nodes depth_first_inplace_search needs to
+    solve board, or max_nodes + 1 if it needs more than max_nodes, and the
+    propagation depth of board."""
+    problem = Takuzu(board)
+    depth_first_inplace_search(problem, max_nodes)
+    return problem.nodes, propagation_depth(board)
+
+
+def add_clues(solution, rng: random.Random):
+    """Builds an instance for solution, a full BitBoard, by giving its
+    cells in random order, skipping those that propagation (see
+    settle_in_place) already fills from the cells given so far, until
+    propagation alone fills the whole board. Returns the instance and the
+    (row, col) cells given."""
+    n = solution.len
+    puzzle = BitBoard.from_rows([[2] * n] * n)
+    filled = puzzle.copy()
+    cells = [(row, col) for row in range(n) for col in range(n)]
+    rng.shuffle(cells)
+    clues = []
+    for row, col in cells:
+        if filled.get_number(row, col) != 2:
+            continue
+        val = solution.get_number(row, col)
+        puzzle.place(row, col, val)
+        filled.place(row, col, val)
+        clues.append((row, col))
+        settle_in_place(filled, [(row, c) for c in range(n)] + [(r, col) for r in range(n)], [])
+    return puzzle, clues
+
+
+def remove_clues(puzzle, clues, rng: random.Random, max_nodes=None):
+    """Empties the given clues of puzzle in random order, skipping those
+    whose removal would allow a second solution. Returns the (row, col)
+    cells emptied, in order; puzzle itself is left as it was."""
+    board = puzzle.copy()
+    clues = list(clues)
+    rng.shuffle(clues)
+    emptied = []
+    for row, col in clues:
+        val = board.get_number(row, col)
+        board.remove(row, col)
+        if has_other_solution(board, row, col, val, max_nodes):
+            board.place(row, col, val)
+        else:
+            emptied.append((row, col))
+    return emptied
+
+
+def generate(n: int, rng=None, nodes=0, depth=0, tries=10, max_nodes=10):
+    """Returns a random BitBoard of size n with a unique solution.
+    Without targets, every clue that can be is emptied (see remove_clues).
+    Otherwise only the fewest clues (found by bisection) are emptied that
+    make the instance need at least nodes search nodes and a propagation
+    depth of at least depth. If tries solutions in a row cannot reach the
+    targets, the hardest instance seen is returned."""
+    rng = rng or random.Random()
+    best = None
+    for _ in range(tries):
+        given, clues = add_clues(random_solution(n, rng), rng)
+        emptied = remove_clues(given, clues, rng, max_nodes)
+
+        def puzzle(count):
+            board = given.copy()
+            for cell in emptied[:count]:
+                board.remove(*cell)
+            return board
+
+        board = puzzle(len(emptied))
+        if not (nodes or depth):
+            return board
+        # Solving stops as soon as the nodes target is passed.
+        score = difficulty(board, nodes)
+        if score[0] >= nodes and score[1] >= depth:
+            low, high = 0, len(emptied)
+            while low < high:
+                middle = (low + high) // 2
+                found = difficulty(puzzle(middle), nodes)
+                if found[0] >= nodes and found[1] >= depth:
+                    high = middle
+                else:
+                    low = middle + 1
+            return puzzle(high)
+        if best is None or score > best[0]:
+            best = score, board
+    return best[1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate Takuzu instances with a unique solution.")
+    parser.add_argument('size', type=int, help="board size")
+    parser.add_argument('--count', type=int, default=1,
+                        help="number of instances (default: 1)")
+    parser.add_argument('--seed', type=int, help="seed of the random generator")
+    parser.add_argument('--nodes', type=int, default=0,
+                        help="least search nodes needed to solve each instance")
+    parser.add_argument('--depth', type=int, default=0,
+                        help="least propagation depth of each instance")
+    parser.add_argument('--max-nodes', type=int, default=10,
+                        help="search nodes allowed to prove a clue can be emptied (default: 10)")
+    parser.add_argument('--output', help="text file to write, default stdout")
+    parser.add_argument('--corpus', help="write a packed corpus (see takuzu_corpus.py) instead")
+    args = parser.parse_args(argv)
+    if args.size < 1:
+        parser.error("the size must be positive")
+
+    rng = random.Random(args.seed)
+
+    def instances():
+        for index in range(args.count):
+            start = time.perf_counter()
+            board = generate(args.size, rng, args.nodes, args.depth, max_nodes=args.max_nodes)
+            clues = args.size ** 2 - len(board.empty_cells())
+            print('{}\t{} clues\t{:.3f}'.format(index + 1, clues, time.perf_counter() - start),
+                  file=sys.stderr)
+            yield board.len, board.to_cells()
+
+    if args.corpus:
+        write_corpus(args.corpus, instances())
+        return
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        for index, (n, cells) in enumerate(instances()):
+            if index:
+                out.write('\n')
+            out.write('{}\n{}\n'.format(n, format_cells(n, cells)))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
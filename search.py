@@ -6,8 +6,13 @@ then create problem instances and solve them with calls to the various search
 functions.
 """
 
+import heapq
+import itertools
+import multiprocessing
+import queue
 import sys
-from collections import deque
+import time
+from collections import OrderedDict, deque
 
 from utils import *
 
@@ -73,7 +78,12 @@ class Node:
     the total path_cost (also known as g) to reach the node. Other functions
     may add an f and h value; see best_first_graph_search and astar_search for
     an explanation of how the f and h values are handled. You will not need to
-    subclass this class."""
+    subclass this class.
+    Nodes use __slots__ instead of a per-instance __dict__, since searches
+    can create millions of them; f and h are slots that stay unset until
+    memoize stores a value in them."""
+
+    __slots__ = ('state', 'parent', 'action', 'path_cost', 'depth', 'f', 'h')
 
     def __init__(self, state, parent=None, action=None, path_cost=0):
         """Create a search tree Node, derived from a parent by an action."""
@@ -96,6 +106,12 @@ class Node:
         return [self.child_node(problem, action)
                 for action in problem.actions(self.state)]
 
+    def expand_lazily(self, problem):
+        """Yield the nodes reachable in one step from this node, building
+        each one only when it is asked for."""
+        for action in problem.actions(self.state):
+            yield self.child_node(problem, action)
+
     def child_node(self, problem, action):
         """[Figure 3.10]"""
         next_state = problem.result(self.state, action)
@@ -201,19 +217,25 @@ def depth_first_tree_search(problem):
     Search through the successors of a problem to find a goal.
     The argument frontier should be an empty queue.
     Repeats infinitely in case of loops.
+    The stack holds one lazy child iterator per level (see
+    Node.expand_lazily), so a child is only built when it is reached.
     """
-
-    frontier = [Node(problem.initial)]  # Stack
+    node = Node(problem.initial)
+    if problem.goal_test(node.state):
+        return node
+    frontier = [node.expand_lazily(problem)]  # Stack of child iterators
     while frontier:
-        node = frontier.pop()
-
-        if problem.goal_test(node.state):
+        node = next(frontier[-1], None)
+        if node is None:
+            frontier.pop()
+        elif problem.goal_test(node.state):
             return node
-        frontier.extend(node.expand(problem))
+        else:
+            frontier.append(node.expand_lazily(problem))
     return None
 
 
-def depth_first_graph_search(problem):
+def depth_first_graph_search(problem, display=False):
     """
     [Figure 3.7]
     Search the deepest nodes in the search tree first.
@@ -221,55 +243,80 @@ def depth_first_graph_search(problem):
     The argument frontier should be an empty queue.
     Does not get trapped by loops.
     If two paths reach a state, only use the first one.
+    The states in the frontier are also kept in a set, so checking a child
+    against the frontier is O(1).
     """
     frontier = [(Node(problem.initial))]  # Stack
-
+    frontier_states = {problem.initial}
     explored = set()
-    i=0
+    peak = 1
     while frontier:
-        i+=1
         node = frontier.pop()
+        frontier_states.discard(node.state)
         if problem.goal_test(node.state):
+            if display:
+                print_graph_search_sizes(peak, len(explored))
             return node
         explored.add(node.state)
-        frontier.extend(child for child in node.expand(problem)
-                        if child.state not in explored and child not in frontier)
+        for child in node.expand(problem):
+            if child.state not in explored and child.state not in frontier_states:
+                frontier.append(child)
+                frontier_states.add(child.state)
+        peak = max(peak, len(frontier))
+    if display:
+        print_graph_search_sizes(peak, len(explored))
     return None
 
 
-def breadth_first_graph_search(problem):
+def breadth_first_graph_search(problem, display=False):
     """[Figure 3.11]
     Note that this function can be implemented in a
     single line as below:
     return graph_search(problem, FIFOQueue())
+    The states in the frontier are also kept in a set, so checking a child
+    against the frontier is O(1).
     """
     node = Node(problem.initial)
     if problem.goal_test(node.state):
         return node
     frontier = deque([node])
+    frontier_states = {node.state}
     explored = set()
+    peak = 1
     while frontier:
         node = frontier.popleft()
+        frontier_states.discard(node.state)
         explored.add(node.state)
         for child in node.expand(problem):
-            if child.state not in explored and child not in frontier:
+            if child.state not in explored and child.state not in frontier_states:
                 if problem.goal_test(child.state):
+                    if display:
+                        print_graph_search_sizes(peak, len(explored))
                     return child
                 frontier.append(child)
+                frontier_states.add(child.state)
+        peak = max(peak, len(frontier))
+    if display:
+        print_graph_search_sizes(peak, len(explored))
     return None
 
 
-def best_first_graph_search(problem, f, display=False):
+def print_graph_search_sizes(peak_frontier, explored):
+    print("peak frontier size:", peak_frontier, "explored set size:", explored)
+
+
+def best_first_graph_search(problem, f, display=False, tie='fifo'):
     """Search the nodes with the lowest f scores first.
     You specify the function f(node) that you want to minimize; for example,
     if f is a heuristic estimate to the goal, then we have greedy best
     first search; if f is node.depth then we have breadth-first search.
     There is a subtlety: the line "f = memoize(f, 'f')" means that the f
     values will be cached on the nodes as they are computed. So after doing
-    a best first search you can examine the f values of the path returned."""
+    a best first search you can examine the f values of the path returned.
+    tie chooses among nodes with equal f, see PriorityQueue."""
     f = memoize(f, 'f')
     node = Node(problem.initial)
-    frontier = PriorityQueue('min', f)
+    frontier = PriorityQueue('min', f, tie)
     frontier.append(node)
     explored = set()
     while frontier:
@@ -295,25 +342,24 @@ def uniform_cost_search(problem, display=False):
 
 
 def depth_limited_search(problem, limit=50):
-    """[Figure 3.17]"""
-
-    def recursive_dls(node, problem, limit):
-        if problem.goal_test(node.state):
+    """[Figure 3.17]
+    Uses an explicit stack of child iterators instead of recursion, so the
+    limit is not bounded by the interpreter's recursion limit. Children are
+    generated lazily, so the search stops at the first goal without
+    building its siblings."""
+    cutoff_occurred = False
+    frontier = [iter([Node(problem.initial)])]  # Stack of child iterators
+    while frontier:
+        node = next(frontier[-1], None)
+        if node is None:
+            frontier.pop()
+        elif problem.goal_test(node.state):
             return node
-        elif limit == 0:
-            return 'cutoff'
+        elif node.depth >= limit:
+            cutoff_occurred = True
         else:
-            cutoff_occurred = False
-            for child in node.expand(problem):
-                result = recursive_dls(child, problem, limit - 1)
-                if result == 'cutoff':
-                    cutoff_occurred = True
-                elif result is not None:
-                    return result
-            return 'cutoff' if cutoff_occurred else None
-
-    # Body of depth_limited_search:
-    return recursive_dls(Node(problem.initial), problem, limit)
+            frontier.append(node.expand_lazily(problem))
+    return 'cutoff' if cutoff_occurred else None
 
 
 def iterative_deepening_search(problem):
@@ -425,6 +471,183 @@ def astar_search(problem, h=None, display=False):
     return best_first_graph_search(problem, lambda n: n.path_cost + h(n), display)
 
 
+def sma_star_search(problem, max_nodes=1000, h=None):
+    """Simplified memory-bounded A* (SMA*): A* tree search that never keeps
+    more than max_nodes nodes in memory. Nodes get f = max(f(parent),
+    g + h) (pathmax), and f = infinity if they are dead ends or too deep
+    to fit a path in memory. After every expansion and every drop, the f
+    of each ancestor is backed up to the best f among its children in
+    memory and those it has forgotten.
+    When the budget is exceeded, the worst leaf (highest f, shallowest on
+    ties) is dropped and its f is remembered by its parent. A node with
+    forgotten children stays open with the best of their f, and when that
+    becomes the best f in memory they are generated again. Returns None if
+    no solution fits.
+    Nodes in memory are known by a serial number rather than by the node
+    (nodes compare equal by state) or its id (reused once it is freed).
+    The heaps only hold serials, so dropped nodes are freed at once, and
+    they are rebuilt without their stale entries once these pile up."""
+    h = memoize(h or problem.h, 'h')
+    counter = itertools.count()
+    serials = itertools.count()
+    best, worst = [], []  # heaps of open nodes and of leaves, lazy deletion
+    nodes = {}  # serial -> node in memory
+    parents = {}  # serial -> serial of its parent, None for the root
+    children = {}  # serial -> serials of its children in memory
+    expanded = set()
+    forgotten = {}  # serial -> best f among its dropped children
+    latest = {}  # serial -> seq of its only valid heap entries
+
+    def open_f(serial):
+        """The f under which the node waits to be expanded, or None."""
+        if serial not in expanded:
+            return nodes[serial].f
+        return forgotten.get(serial)
+
+    def push(serial):
+        node = nodes[serial]
+        seq = latest[serial] = next(counter)
+        f = open_f(serial)
+        if f is not None:
+            heapq.heappush(best, (f, -node.depth, seq, serial))
+        if not children.get(serial):
+            heapq.heappush(worst, (-node.f, node.depth, seq, serial))
+
+    def valid(entry):
+        return latest.get(entry[3]) == entry[2]
+
+    def backup(serial):
+        """Pushes the node again, then raises the f of its ancestors for as
+        long as it changes."""
+        push(serial)
+        while serial is not None:
+            node = nodes[serial]
+            values = [nodes[child].f for child in children.get(serial, ())]
+            if serial in forgotten:
+                values.append(forgotten[serial])
+            if not values or min(values) <= node.f:
+                break
+            node.f = min(values)
+            push(serial)
+            serial = parents[serial]
+
+    def add(node, parent):
+        serial = next(serials)
+        nodes[serial] = node
+        parents[serial] = parent
+        push(serial)
+        return serial
+
+    root = Node(problem.initial)
+    root.f = h(root)
+    add(root, None)
+    while best:
+        if len(best) + len(worst) > 4 * max_nodes:
+            best[:] = filter(valid, best)
+            worst[:] = filter(valid, worst)
+            heapq.heapify(best)
+            heapq.heapify(worst)
+        entry = heapq.heappop(best)
+        if not valid(entry):
+            continue
+        f, serial = entry[0], entry[3]
+        if f == np.inf:
+            return None
+        node = nodes[serial]
+        if serial not in expanded:
+            if problem.goal_test(node.state):
+                return node
+            expanded.add(serial)
+            successors = node.expand(problem)
+        else:
+            # generate the forgotten children again
+            del forgotten[serial]
+            kept = {nodes[child].action for child in children.get(serial, ())}
+            successors = [child for child in node.expand(problem) if child.action not in kept]
+        if not successors and not children.get(serial):
+            node.f = np.inf
+        for child in successors:
+            if child.depth >= max_nodes - 1 and not problem.goal_test(child.state):
+                child.f = np.inf
+            else:
+                child.f = max(node.f, child.path_cost + h(child))
+            children.setdefault(serial, []).append(add(child, serial))
+        backup(serial)
+        while len(nodes) > max_nodes:
+            entry = heapq.heappop(worst)
+            leaf = entry[3]
+            if not valid(entry) or children.get(leaf) or parents[leaf] is None:
+                continue
+            parent = parents.pop(leaf)
+            f = nodes.pop(leaf).f
+            for table in (children, forgotten, latest):
+                table.pop(leaf, None)
+            expanded.discard(leaf)
+            children[parent].remove(leaf)
+            forgotten[parent] = min(forgotten.get(parent, np.inf), f)
+            backup(parent)
+    return None
+
+
+def beam_search(problem, width=10, h=None):
+    """Breadth-first search that keeps only the width best nodes of each
+    depth, ranked by f(n) = g(n)+h(n), so memory and time per level are
+    bounded. States already seen are not generated again. Incomplete:
+    returns None if every path to a goal falls out of the beam."""
+    h = memoize(h or problem.h, 'h')
+    node = Node(problem.initial)
+    layer = [node]
+    explored = {node.state}
+    while layer:
+        children = []
+        for node in layer:
+            if problem.goal_test(node.state):
+                return node
+            for child in node.expand(problem):
+                if child.state not in explored:
+                    explored.add(child.state)
+                    children.append(child)
+        layer = heapq.nsmallest(width, children, key=lambda n: n.path_cost + h(n))
+    return None
+
+
+def anytime_weighted_astar_search(problem, weight=2, time_limit=None, h=None, display=False):
+    """Anytime weighted A*: best-first search on g(n) + weight*h(n), which
+    finds a first solution quickly, and then keeps searching for better
+    ones, pruning every node whose g(n)+h(n) cannot beat the best
+    solution so far. It stops when no node is left, in which case the
+    solution is optimal if h is admissible, or when time_limit seconds
+    have passed. Returns the best solution found."""
+    h = memoize(h or problem.h, 'h')
+    start = time.time()
+    node = Node(problem.initial)
+    frontier = PriorityQueue('min', lambda n: n.path_cost + weight * h(n))
+    frontier.append(node)
+    best_g = {node.state: 0}
+    incumbent = None
+    while frontier:
+        if time_limit is not None and time.time() - start > time_limit:
+            break
+        node = frontier.pop()
+        if incumbent and node.path_cost + h(node) >= incumbent.path_cost:
+            continue
+        if problem.goal_test(node.state):
+            incumbent = node
+            if display:
+                print("solution of cost", node.path_cost, "after", time.time() - start, "seconds")
+            continue
+        for child in node.expand(problem):
+            if incumbent and child.path_cost + h(child) >= incumbent.path_cost:
+                continue
+            if best_g.get(child.state, np.inf) <= child.path_cost:
+                continue
+            best_g[child.state] = child.path_cost
+            if child in frontier:
+                del frontier[child]
+            frontier.append(child)
+    return incumbent
+
+
 # ______________________________________________________________________________
 # A* heuristics
 
@@ -1514,6 +1737,135 @@ def mutate_boggle(board):
     return i, oldc
 
 
+# ______________________________________________________________________________
+# Transposition tables
+
+
+class TranspositionTable:
+    """A set of state hashes with at most maxsize entries, each stored with
+    the depth at which it was found. When full, policy 'lru' evicts the
+    least recently used entry and policy 'depth' prefers to keep the
+    shallowest entries, since those cut off the largest subtrees."""
+
+    def __init__(self, maxsize=100000, policy='lru'):
+        if policy not in ('lru', 'depth'):
+            raise ValueError("Policy must be either 'lru' or 'depth'.")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.entries = OrderedDict()
+        self.heap = []  # (-depth, key) entries, for the 'depth' policy
+
+    def __contains__(self, key):
+        if key in self.entries:
+            if self.policy == 'lru':
+                self.entries.move_to_end(key)
+            return True
+        return False
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, key, depth=0):
+        if key in self.entries or self.maxsize <= 0:
+            return
+        if len(self.entries) >= self.maxsize:
+            if self.policy == 'lru':
+                self.entries.popitem(last=False)
+            else:
+                while -self.heap[0][0] != self.entries.get(self.heap[0][1]):
+                    heapq.heappop(self.heap)
+                if depth >= -self.heap[0][0]:
+                    return
+                del self.entries[heapq.heappop(self.heap)[1]]
+        self.entries[key] = depth
+        if self.policy == 'depth':
+            heapq.heappush(self.heap, (-depth, key))
+
+
+class TranspositionProblem(Problem):
+    """Delegates to a problem and remembers, in a TranspositionTable keyed
+    on hash(state), the states that have no goal below them. A state is
+    dead when it has no actions and is not a goal, or when every one of
+    its actions has been tried and leads to a dead state. A state cut off
+    by a depth limit is never expanded, so it is never dead, and neither
+    is any state above it. Dead states are given no actions, so any tree
+    searcher run on this problem never explores the same failed subtree
+    twice.
+
+    The bookkeeping of expanded states is bounded by maxsize too; losing
+    an entry only means a parent may not be recognised as dead."""
+
+    def __init__(self, problem, maxsize=100000, policy='lru'):
+        self.problem = problem
+        self.dead = TranspositionTable(maxsize, policy)
+        self.maxsize = maxsize
+        # hash(state) -> [depth, hashes of parents, number of actions,
+        #                 {action: hash of the child it leads to}]
+        self.seen = OrderedDict()
+        self.hits = 0
+
+    def info(self, key, depth=0):
+        info = self.seen.get(key)
+        if info is None:
+            info = self.seen[key] = [depth, set(), None, {}]
+            if len(self.seen) > self.maxsize:
+                self.seen.popitem(last=False)
+        return info
+
+    def actions(self, state):
+        key = hash(state)
+        if key in self.dead:
+            self.hits += 1
+            self.mark_dead(key)
+            return []
+        actions = self.problem.actions(state)
+        if not actions:
+            if not self.problem.goal_test(state):
+                self.mark_dead(key)
+        else:
+            info = self.info(key)
+            if info[2] is None:
+                info[2] = len(actions)
+        return actions
+
+    def result(self, state, action):
+        child = self.problem.result(state, action)
+        parent = self.seen.get(hash(state))
+        depth = parent[0] + 1 if parent else 0
+        self.info(hash(child), depth)[1].add(hash(state))
+        if parent:
+            parent[3][action] = hash(child)
+        return child
+
+    def mark_dead(self, key):
+        """Records key as dead, and then every parent whose actions have
+        all been tried and all lead to dead states."""
+        keys = [key]
+        while keys:
+            key = keys.pop()
+            info = self.seen.pop(key, None)
+            self.dead.add(key, info[0] if info else 0)
+            if info is None:
+                continue
+            for parent in info[1]:
+                parent_info = self.seen.get(parent)
+                if parent_info and parent_info[2] == len(parent_info[3]) \
+                        and all(child in self.dead for child in parent_info[3].values()):
+                    keys.append(parent)
+
+    def goal_test(self, state):
+        return self.problem.goal_test(state)
+
+    def path_cost(self, c, state1, action, state2):
+        return self.problem.path_cost(c, state1, action, state2)
+
+    def value(self, state):
+        return self.problem.value(state)
+
+    def __getattr__(self, attr):
+        return getattr(self.problem, attr)
+
+
 # ______________________________________________________________________________
 
 # Code to compare searchers on various problems.
@@ -1575,6 +1927,176 @@ def compare_searchers(problems, header,
     print_table(table, header)
 
 
+def portfolio_worker(index, searcher, problem, results):
+    try:
+        result = searcher(problem)
+    except Exception:
+        result = None
+    results.put((index, result.solution() if isinstance(result, Node) else None))
+
+
+def portfolio_search(problem, searchers=[depth_first_tree_search,
+                                         breadth_first_tree_search,
+                                         astar_search],
+                     timeout=None, display=False):
+    """Runs every searcher on problem at the same time, each in its own
+    process, and returns the goal node found first, stopping the others.
+    An entry of searchers can also be a (searcher, problem) pair, to race
+    differently configured versions of the same problem (e.g. other
+    branching orders). Returns None if every searcher fails (a searcher
+    that raises or whose process dies counts as failing) or timeout
+    seconds pass. Searchers and problems must be picklable.
+    Only the solution's actions come back from the winning process; the
+    goal node is rebuilt here by replaying them from problem.initial."""
+    entries = [entry if isinstance(entry, tuple) else (entry, problem)
+               for entry in searchers]
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=portfolio_worker,
+                                       args=(index, searcher, p, results), daemon=True)
+               for index, (searcher, p) in enumerate(entries)]
+    for worker in workers:
+        worker.start()
+    deadline = None if timeout is None else time.time() + timeout
+    failed = set()
+    try:
+        while len(failed) < len(workers):
+            try:
+                index, solution = results.get(timeout=0.05)
+            except queue.Empty:
+                if deadline is not None and time.time() >= deadline:
+                    return None
+                failed.update(index for index, worker in enumerate(workers)
+                              if worker.exitcode not in (None, 0))
+                continue
+            if solution is None:
+                failed.add(index)
+            else:
+                searcher, p = entries[index]
+                if display:
+                    print(name(searcher), "found the solution first")
+                node = Node(p.initial)
+                for action in solution:
+                    node = node.child_node(p, action)
+                return node
+        return None
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join()
+
+
+def parallel_dfs_worker(problem, tasks, results, found, pending, hungry, check_every):
+    """Runs depth-first tree search on the subtrees taken from tasks. While
+    other workers are waiting for work, the shallowest node of the local
+    stack is given away to them."""
+    waiting = False
+    while not found.is_set():
+        try:
+            path = tasks.get(timeout=0.05)
+        except queue.Empty:
+            if not waiting:
+                waiting = True
+                with hungry.get_lock():
+                    hungry.value += 1
+            if pending.value == 0:
+                break
+            continue
+        if waiting:
+            waiting = False
+            with hungry.get_lock():
+                hungry.value -= 1
+        node = Node(problem.initial)
+        for action in path:
+            node = node.child_node(problem, action)
+        frontier = [node]  # Stack
+        steps = 0
+        try:
+            while frontier:
+                node = frontier.pop()
+                if problem.goal_test(node.state):
+                    results.put(node.solution())
+                    found.set()
+                    return
+                frontier.extend(node.expand(problem))
+                steps += 1
+                if steps % check_every == 0:
+                    if found.is_set():
+                        return
+                    for _ in range(min(hungry.value, len(frontier) - 1)):
+                        with pending.get_lock():
+                            pending.value += 1
+                        tasks.put(frontier.pop(0).solution())
+        finally:
+            with pending.get_lock():
+                pending.value -= 1
+
+
+def parallel_depth_first_tree_search(problem, workers=None, split=4, check_every=64):
+    """Depth-first tree search spread over a pool of processes.
+    The tree is first expanded breadth-first until there are split
+    subtrees per worker. The subtrees are put on a shared queue. Each worker
+    searches one subtree at a time with its own stack. When a worker runs
+    out of work, busy workers hand it the shallowest nodes of their
+    stacks (checked every check_every expansions). All workers stop
+    as soon as one of them finds a goal. If a worker fails, the rest of
+    its subtree is lost, so the search is aborted with a RuntimeError.
+    Subtrees are sent between processes as the list of actions leading
+    to them, so the problem (not its states) must be picklable. The goal
+    node is rebuilt here by replaying the winning actions."""
+    workers = workers or multiprocessing.cpu_count()
+    frontier = deque([Node(problem.initial)])
+    while frontier and len(frontier) < split * workers:
+        node = frontier.popleft()
+        if problem.goal_test(node.state):
+            return node
+        frontier.extend(node.expand(problem))
+    if not frontier:
+        return None
+    # Subtrees are handed out deepest-first, in depth-first order.
+    frontier.reverse()
+
+    tasks = multiprocessing.Queue()
+    results = multiprocessing.Queue()
+    found = multiprocessing.Event()
+    pending = multiprocessing.Value('i', len(frontier))
+    hungry = multiprocessing.Value('i', 0)
+    for node in frontier:
+        tasks.put(node.solution())
+    processes = [multiprocessing.Process(target=parallel_dfs_worker, daemon=True,
+                                         args=(problem, tasks, results, found,
+                                               pending, hungry, check_every))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    try:
+        while True:
+            try:
+                solution = results.get(timeout=0.05)
+                break
+            except queue.Empty:
+                for process in processes:
+                    if process.exitcode not in (None, 0):
+                        raise RuntimeError("a search worker failed with exit code {}"
+                                           .format(process.exitcode))
+                if not any(process.is_alive() for process in processes):
+                    try:
+                        solution = results.get(timeout=0.05)
+                        break
+                    except queue.Empty:
+                        return None
+    finally:
+        found.set()
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+    node = Node(problem.initial)
+    for action in solution:
+        node = node.child_node(problem, action)
+    return node
+
+
 def compare_graph_searchers():
     """Prints a table of search results."""
     compare_searchers(problems=[GraphProblem('Arad', 'Bucharest', romania_map),
@@ -6,7 +6,12 @@
 # 99095 João Furtado
 # 99078 Guilherme Carabalone
 
+import io
 import sys
+import heapq
+import random
+
+import numpy as np
 from search import (
     Problem,
     InstrumentedProblem,
@@ -21,23 +26,123 @@ from search import (
 )
 
 
+def zobrist_keys(n: int, cache={}):
+    """Random 64-bit Zobrist keys for an n x n board: keys[row * n + col][val]
+    is the key of val at (row, col). Seeded with n, so every process gets
+    the same keys for the same size."""
+    if n not in cache:
+        rng = random.Random(n)
+        cache[n] = [(rng.getrandbits(64), rng.getrandbits(64)) for _ in range(n * n)]
+    return cache[n]
+
+
 class TakuzuState:
-    state_id = 0
+    """A Takuzu search state. States compare equal when their boards hold
+    the same values. The hash is the board's Zobrist hash, which the board
+    keeps up to date on every placement, so hashing a state is O(1) and
+    board.key() is only compared when two hashes collide."""
 
-    def __init__(self, board):
+    def __init__(self, board, dead=False, cells=None):
         self.board = board
-        self.id = TakuzuState.state_id
-        TakuzuState.state_id += 1
+        # True when propagation found an empty cell with no legal value.
+        self.dead = dead
+        # CellHeap of the empty cells of board, when MRV branching is used.
+        self.cells = cells
+        self.hash = board.zobrist
+
+    def __eq__(self, other):
+        return isinstance(other, TakuzuState) and self.hash == other.hash \
+            and self.board.key() == other.board.key()
+
+    def __hash__(self):
+        return self.hash
+
+
+# Maps the digits 0, 1 and 2 to the byte values 0, 1 and 2.
+DIGITS = bytes.maketrans(b'012', b'\x00\x01\x02')
+
 
-    def __lt__(self, other):
-        return self.id < other.id
+def parse_cells(stream):
+    """Reads Takuzu instances from stream, one after the other: each one is
+    the size N on a line and then N rows of N digits (0, 1 or 2 for
+    empty), separated by tabs or spaces, or not at all. Blank lines are
+    skipped. The stream can be a binary or text file, a memory-mapped
+    file or a bytes object.
+    Yields (n, cells) for each instance, cells being n*n bytes holding the
+    values row by row, converted with bytes.translate. Raises ValueError
+    on malformed input."""
+    if isinstance(stream, (bytes, bytearray)):
+        stream = io.BytesIO(stream)
+    number = 0
+
+    def next_line():
+        nonlocal number
+        while True:
+            line = stream.readline()
+            if not line:
+                return None
+            number += 1
+            if isinstance(line, str):
+                line = line.encode()
+            if line.strip():
+                return line
+
+    while True:
+        header = next_line()
+        if header is None:
+            return
+        try:
+            n = int(header)
+        except ValueError:
+            raise ValueError("line {}: expected the board size, got {!r}".format(number, header.strip()))
+        if n < 1:
+            raise ValueError("line {}: the board size must be positive, got {}".format(number, n))
+        cells = bytearray()
+        for row in range(n):
+            line = next_line()
+            if line is None:
+                raise ValueError("unexpected end of input: expected {} rows, got {}".format(n, row))
+            values = line.translate(DIGITS, b' \t\r\n')
+            if values.translate(None, b'\x00\x01\x02'):
+                raise ValueError("line {}: cells must be 0, 1 or 2, got {!r}".format(number, line.strip()))
+            if len(values) != n:
+                raise ValueError("line {}: expected {} cells, got {}".format(number, n, len(values)))
+            cells += values
+        yield n, bytes(cells)
+
+
+# Maps the cell values 0, 1 and 2 back to their digits.
+VALUES = bytes.maketrans(b'\x00\x01\x02', b'012')
+
+
+def format_cells(n: int, cells: bytes, compact=False):
+    """Renders n*n cell values given row by row in the output format, N
+    rows of tab-separated digits, or, if compact, as the n*n digits on a
+    single line. The digits and separators are laid out in one buffer by
+    slice assignment, so the cost is linear in the size of the board."""
+    digits = bytes(cells).translate(VALUES)
+    if compact:
+        return digits.decode('ascii')
+    out = bytearray(b'\t' * (2 * n * n - 1))
+    out[0::2] = digits
+    out[2 * n - 1::2 * n] = b'\n' * (n - 1)
+    return out.decode('ascii')
 
 
 class Board:
     """Representação interna de um tabuleiro de Takuzu."""
-    def __init__(self, board: tuple):
+    def __init__(self, board: tuple, zobrist=None):
         self.board = board
         self.len = len(board)
+        self.keys = zobrist_keys(self.len)
+        # Copies pass their hash along instead of scanning every cell again.
+        self.zobrist = zobrist
+        if zobrist is None:
+            self.zobrist = 0
+            for row, line in enumerate(board):
+                for col, val in enumerate(line):
+                    if val != 2:
+                        self.zobrist ^= self.keys[row * self.len + col][val]
     
     def get_number(self, row: int, col: int) -> int:
         """Devolve o valor na respetiva posição do tabuleiro."""
@@ -80,21 +185,28 @@ class Board:
             > stdin.readline()
         """
 
-        read = sys.stdin.read()
-        board = [[] for x in range(int(read.split("\n")[0]))]
-        for index, line in enumerate(read.split('\n')[1:-1]):
-            board[index] += [int(x) for x in line.split('\t')]
-        return Board(tuple(board))
+        for board in Board.parse_instances(sys.stdin.buffer):
+            return board
+        raise ValueError("no instance in the input")
+
+    @staticmethod
+    def parse_instances(stream):
+        """Yields a Board for each instance in a stream holding one or more
+        instances in the input format (see parse_cells)."""
+        for n, cells in parse_cells(stream):
+            yield Board.from_cells(n, cells)
+
+    @staticmethod
+    def from_cells(n: int, cells: bytes):
+        """Builds a Board from n*n cell values given row by row."""
+        return Board(tuple(list(cells[row * n:(row + 1) * n]) for row in range(n)))
+
+    def to_cells(self):
+        """Returns the n*n cell values row by row, as read by from_cells."""
+        return bytes(val for row in self.board for val in row)
 
     def __str__(self):
-        string = ""
-        for row in self.board:
-            for index, element in enumerate(row):
-                if index == self.len-1:
-                    string += str(element) + '\n'
-                else:
-                    string += str(element) + '\t'
-        return string[:-1]
+        return format_cells(self.len, self.to_cells())
 
 
     #TODO as linhas não podem conter 2   (em teoria)  
@@ -170,15 +282,377 @@ class Board:
                 return False
         return True
 
+    def is_legal(self, row: int, col: int, val: int):
+        """Checks whether placing val at (row, col) keeps the board legal,
+        looking only at the row and column of the cell. Assumes the board
+        was legal before the placement."""
+        limit = self.len // 2 + self.len % 2
+        line = list(self.board[row])
+        line[col] = val
+        column = [r[col] for r in self.board]
+        column[row] = val
+        for index, cells in ((col, line), (row, column)):
+            if cells.count(val) > limit:
+                return False
+            for start in range(max(index - 2, 0), min(index, self.len - 3) + 1):
+                if cells[start] == cells[start + 1] == cells[start + 2]:
+                    return False
+        if 2 not in line:
+            for index, other in enumerate(self.board):
+                if index != row and list(other) == line:
+                    return False
+        if 2 not in column:
+            for index in range(self.len):
+                if index != col and [r[index] for r in self.board] == column:
+                    return False
+        return True
+
+    def copy(self):
+        return Board([line[:] for line in self.board], self.zobrist)
+
+    def key(self):
+        """Immutable packed form of the board: one byte per cell."""
+        return bytes(val for line in self.board for val in line)
+
+    def place(self, row: int, col: int, val: int):
+        """Places val at (row, col), modifying this board."""
+        self.board[row][col] = val
+        self.zobrist ^= self.keys[row * self.len + col][val]
+
+    def remove(self, row: int, col: int):
+        """Empties (row, col), modifying this board."""
+        self.zobrist ^= self.keys[row * self.len + col][self.board[row][col]]
+        self.board[row][col] = 2
+
+    def set_number(self, row: int, col: int, val: int):
+        """Returns a new board equal to this one with val placed at
+        (row, col)."""
+        result = self.copy()
+        result.place(row, col, val)
+        return result
+
+    def empty_cells(self):
+        """Returns the (row, col) positions that are still empty."""
+        return [(row, col) for row, line in enumerate(self.board)
+                for col, val in enumerate(line) if val == 2]
+
+
+class BitBoard:
+    """Bit-packed Takuzu board. Each row and each column is kept as a pair
+    of bitmasks (ones, filled), bit c of a row mask being column c and bit
+    r of a column mask being row r, together with running counts of zeros
+    and ones per line. Placing a value updates the masks incrementally and
+    every rule check is a few integer operations per line.
+
+    Drop-in replacement for Board."""
+
+    def __init__(self, n: int, row_ones: list, row_filled: list,
+                 col_ones: list, col_filled: list, counts: list, zobrist=0):
+        self.len = n
+        self.full = (1 << n) - 1
+        self.row_ones = row_ones
+        self.row_filled = row_filled
+        self.col_ones = col_ones
+        self.col_filled = col_filled
+        # counts[v][i] is the number of v's in row i (i < n) or in
+        # column i - n (i >= n).
+        self.counts = counts
+        # Zobrist hash of the board, see zobrist_keys.
+        self.keys = zobrist_keys(n)
+        self.zobrist = zobrist
+
+    @staticmethod
+    def from_rows(rows):
+        """Builds a BitBoard from a sequence of rows of 0, 1 and 2."""
+        n = len(rows)
+        board = BitBoard(n, [0] * n, [0] * n, [0] * n, [0] * n,
+                         [[0] * (2 * n), [0] * (2 * n)])
+        for row, line in enumerate(rows):
+            for col, val in enumerate(line):
+                if val != 2:
+                    board.place(row, col, val)
+        return board
+
+    @staticmethod
+    def from_board(board: Board):
+        return BitBoard.from_rows(board.board)
+
+    @staticmethod
+    def parse_instance_from_stdin():
+        """Lê o test do standard input (stdin) e retorna uma instância
+        da classe BitBoard."""
+        return BitBoard.from_board(Board.parse_instance_from_stdin())
+
+    def place(self, row: int, col: int, val: int):
+        """Places val at (row, col), modifying this board."""
+        self.row_filled[row] |= 1 << col
+        self.col_filled[col] |= 1 << row
+        if val:
+            self.row_ones[row] |= 1 << col
+            self.col_ones[col] |= 1 << row
+        self.counts[val][row] += 1
+        self.counts[val][self.len + col] += 1
+        self.zobrist ^= self.keys[row * self.len + col][val]
+
+    def remove(self, row: int, col: int):
+        """Empties (row, col), modifying this board."""
+        val = self.get_number(row, col)
+        self.row_filled[row] &= ~(1 << col)
+        self.col_filled[col] &= ~(1 << row)
+        self.row_ones[row] &= ~(1 << col)
+        self.col_ones[col] &= ~(1 << row)
+        self.counts[val][row] -= 1
+        self.counts[val][self.len + col] -= 1
+        self.zobrist ^= self.keys[row * self.len + col][val]
+
+    def key(self):
+        """Immutable packed form of the board: the ones and filled masks of
+        all rows concatenated into two integers."""
+        ones = filled = 0
+        for row in range(self.len - 1, -1, -1):
+            ones = ones << self.len | self.row_ones[row]
+            filled = filled << self.len | self.row_filled[row]
+        return ones, filled
+
+    def copy(self):
+        return BitBoard(self.len, self.row_ones[:], self.row_filled[:],
+                        self.col_ones[:], self.col_filled[:],
+                        [self.counts[0][:], self.counts[1][:]], self.zobrist)
+
+    def set_number(self, row: int, col: int, val: int):
+        """Returns a new board equal to this one with val placed at
+        (row, col)."""
+        result = self.copy()
+        result.place(row, col, val)
+        return result
+
+    def empty_cells(self):
+        """Returns the (row, col) positions that are still empty."""
+        cells = []
+        for row, filled in enumerate(self.row_filled):
+            empty = ~filled & self.full
+            while empty:
+                bit = empty & -empty
+                cells.append((row, bit.bit_length() - 1))
+                empty ^= bit
+        return cells
+
+    def is_legal(self, row: int, col: int, val: int):
+        """Checks whether placing val at (row, col) keeps the board legal,
+        looking only at the row and column of the cell. Assumes the board
+        was legal before the placement."""
+        limit = self.len // 2 + self.len % 2
+        if self.counts[val][row] >= limit or self.counts[val][self.len + col] >= limit:
+            return False
+        lines = ((self.row_ones, self.row_filled, row, col),
+                 (self.col_ones, self.col_filled, col, row))
+        for ones_masks, filled_masks, line, index in lines:
+            filled = filled_masks[line] | 1 << index
+            ones = ones_masks[line] | val << index
+            same = ones if val else filled & ~ones
+            if same & same >> 1 & same >> 2 & (0b111 << index >> 2):
+                return False
+            if filled == self.full:
+                for other in range(self.len):
+                    if other != line and filled_masks[other] == self.full \
+                            and ones_masks[other] == ones:
+                        return False
+        return True
+
+    def get_number(self, row: int, col: int) -> int:
+        """Devolve o valor na respetiva posição do tabuleiro."""
+        if not self.row_filled[row] >> col & 1:
+            return 2
+        return self.row_ones[row] >> col & 1
+
+    def adjacent_vertical_numbers(self, row: int, col: int):
+        """Devolve os valores imediatamente abaixo e acima,
+        respectivamente."""
+        if row == 0:
+            return self.get_number(row + 1, col), None
+        elif row == self.len - 1:
+            return None, self.get_number(row - 1, col)
+        return self.get_number(row + 1, col), self.get_number(row - 1, col)
+
+    def adjacent_horizontal_numbers(self, row: int, col: int):
+        """Devolve os valores imediatamente à esquerda e à direita,
+        respectivamente."""
+        if col == 0:
+            return None, self.get_number(row, col + 1)
+        elif col == self.len - 1:
+            return self.get_number(row, col - 1), None
+        return self.get_number(row, col - 1), self.get_number(row, col + 1)
+
+    @property
+    def board(self):
+        """The board as a tuple of lists of 0, 1 and 2, as in Board."""
+        return tuple([self.get_number(row, col) for col in range(self.len)]
+                     for row in range(self.len))
+
+    def __contains__(self, number: int):
+        if number == 2:
+            return not self.full_board()
+        if number == 1:
+            return any(self.row_ones)
+        return any(f & ~o for f, o in zip(self.row_filled, self.row_ones))
+
+    def to_cells(self):
+        """Returns the n*n cell values row by row, as in Board.to_cells."""
+        return bytes(self.get_number(row, col) for row in range(self.len)
+                     for col in range(self.len))
+
+    def __str__(self):
+        return format_cells(self.len, self.to_cells())
+
+    def check_lines(self):
+        return len(set(zip(self.row_ones, self.row_filled))) == self.len
+
+    def check_cols(self):
+        return len(set(zip(self.col_ones, self.col_filled))) == self.len
+
+    def check_adjacent(self):
+        for ones, filled in zip(self.row_ones + self.col_ones,
+                                self.row_filled + self.col_filled):
+            zeros = filled & ~ones
+            if ones & ones >> 1 & ones >> 2 or zeros & zeros >> 1 & zeros >> 2:
+                return False
+        return True
+
+    def check_over_half(self):
+        limit = self.len // 2 + self.len % 2
+        return max(self.counts[0]) <= limit and max(self.counts[1]) <= limit
+
+    def generate_possibilities(self):
+        """Same choice as Board.generate_possibilities: the first empty
+        cell of the last row that still has one."""
+        for row in range(self.len - 1, -1, -1):
+            filled = self.row_filled[row]
+            if filled != self.full:
+                col = (~filled & (filled + 1)).bit_length() - 1
+                return [(row, col, 0), (row, col, 1)]
+
+    def full_board(self):
+        return all(filled == self.full for filled in self.row_filled)
+
+
+class CellHeap:
+    """The empty cells of a board ordered by how many legal values they
+    have left (most constrained first), for MRV branching.
+
+    Entries are (count, row, col) tuples in a heap with lazy deletion: an
+    entry is valid only while legal[(row, col)] still equals its count.
+    Filling a cell only re-scores the empty cells of its row and column
+    (and every cell once a line becomes full, since is_legal then also
+    compares against that line), so each selection costs O(log N^2)."""
+
+    def __init__(self, board=None):
+        self.heap = []
+        self.legal = {}
+        if board is not None:
+            for row, col in board.empty_cells():
+                self.legal[(row, col)] = self.count(board, row, col)
+            self.heap = [(count, row, col) for (row, col), count in self.legal.items()]
+            heapq.heapify(self.heap)
+
+    @staticmethod
+    def count(board, row: int, col: int):
+        return board.is_legal(row, col, 0) + board.is_legal(row, col, 1)
+
+    def copy(self):
+        result = CellHeap()
+        result.heap = self.heap[:]
+        result.legal = dict(self.legal)
+        return result
+
+    def rescore(self, board, row: int, col: int):
+        count = self.count(board, row, col)
+        if self.legal[(row, col)] != count:
+            self.legal[(row, col)] = count
+            heapq.heappush(self.heap, (count, row, col))
+
+    def fill(self, board, row: int, col: int, val: int):
+        """Places val at (row, col) on board and updates the heap."""
+        board.place(row, col, val)
+        del self.legal[(row, col)]
+        line = [(row, c) for c in range(board.len) if (row, c) in self.legal]
+        column = [(r, col) for r in range(board.len) if (r, col) in self.legal]
+        if not line or not column:
+            line, column = list(self.legal), []
+        for r, c in line + column:
+            self.rescore(board, r, c)
+
+    def top(self):
+        """Returns the (count, row, col) entry of the most constrained empty
+        cell, or None if the board is full."""
+        heap = self.heap
+        while heap:
+            count, row, col = heap[0]
+            if self.legal.get((row, col)) == count:
+                return heap[0]
+            heapq.heappop(heap)
+        return None
+
+    def settle(self, board):
+        """Fills cells with a single legal value until every empty cell has
+        two. Returns False if some cell has none."""
+        while True:
+            top = self.top()
+            if top is None or top[0] == 2:
+                return True
+            count, row, col = top
+            if count == 0:
+                return False
+            self.fill(board, row, col, 0 if board.is_legal(row, col, 0) else 1)
+
+
 class Takuzu(Problem):
-    def __init__(self, board: Board):
-        """O construtor especifica o estado inicial."""
-        self.initial = TakuzuState(board)
+    def __init__(self, board: Board, local_check=True, propagation=True, mrv=True):
+        """O construtor especifica o estado inicial.
+        If local_check is True, actions are validated by looking only at
+        the row and column they touch (board.is_legal). With 'scan' (or
+        False) every candidate board is built and fully rescanned by the
+        board.check_* methods, and with 'numpy' all the candidates of a
+        state are built and checked in one batch (see check_boards).
+        If propagation is True, forced cells are filled (see propagate)
+        on the initial board and after every action, so the search only
+        branches on cells where both values are still possible.
+        If mrv is True, the search branches on the empty cell with fewest
+        legal values left (see CellHeap) instead of the cell chosen by
+        board.generate_possibilities."""
+        self.local_check = local_check
+        self.propagation = propagation
+        self.mrv = mrv
+        if mrv:
+            board = board.copy()
+            self.initial = self.mrv_state(board, CellHeap(board))
+        else:
+            self.initial = self.propagated_state(board)
+
+    def mrv_state(self, board, cells: CellHeap):
+        """Builds the state for board, which the state takes ownership of."""
+        dead = self.propagation and not cells.settle(board)
+        return TakuzuState(board, dead, cells)
+
+    def propagated_state(self, board):
+        if not self.propagation:
+            return TakuzuState(board)
+        result = propagate(board)
+        if result is None:
+            return TakuzuState(board, dead=True)
+        return TakuzuState(result)
 
     def actions(self, state: TakuzuState):
         """Retorna uma lista de ações que podem ser executadas a
         partir do estado passado como argumento."""
-        actions = state.board.generate_possibilities()
+        if state.dead:
+            return []
+        if self.mrv:
+            top = state.cells.top()
+            if top is None:
+                return []
+            actions = [(top[1], top[2], 0), (top[1], top[2], 1)]
+        else:
+            actions = state.board.generate_possibilities()
         actions = self.patch_illegal(state, actions)
         return actions
 
@@ -188,9 +662,11 @@ class Takuzu(Problem):
         das presentes na lista obtida pela execução de
         self.actions(state)."""
         row, col, val = action[0], action[1], action[2]
-        result_board = [[x for x in row] for row in state.board.board] 
-        result_board[row][col] = val
-        return TakuzuState(Board(result_board))
+        if self.mrv:
+            board, cells = state.board.copy(), state.cells.copy()
+            cells.fill(board, row, col, val)
+            return self.mrv_state(board, cells)
+        return self.propagated_state(state.board.set_number(row, col, val))
 
     def goal_test(self, state: TakuzuState):
         """Retorna True se e só se o estado passado como argumento é
@@ -202,10 +678,14 @@ class Takuzu(Problem):
     
     def patch_illegal(self, state: TakuzuState, arr: list):
         """Given a list containing actions, it removes the illegal moves."""
+        if self.local_check is True:
+            return [action for action in arr if state.board.is_legal(*action)]
+        if self.local_check == 'numpy':
+            children = stack_children(((state.board, action) for action in arr), state.board.len)
+            return [action for action, legal in zip(arr, check_boards(children)) if legal]
         temp = ()
         for action in arr:
-            res = self.result(state, action)
-            board_res = res.board
+            board_res = state.board.set_number(*action)
             if not (board_res.check_over_half()):
                 temp += (action,)
             # if not (board_res.check_zero_one()):
@@ -229,6 +709,155 @@ class Takuzu(Problem):
         return res
     
     
+def propagate(board):
+    """Returns a copy of board where every forced cell is filled, repeating
+    until nothing changes. A cell is forced when only one of its values
+    passes board.is_legal: it sits between two equal values, next to two
+    equal values, or its row or column already holds as many of one
+    digit as it can. Returns None if some empty cell has no legal value."""
+    board = board.copy()
+    if not CellHeap(board).settle(board):
+        return None
+    return board
+
+
+def settle_in_place(board, cells, trail: list):
+    """Fills forced cells of board in place, starting from the given cells
+    and following the row and column of every cell it fills. Each filled
+    (row, col) is appended to trail. Returns False if some cell has no
+    legal value."""
+    cells = list(cells)
+    while cells:
+        row, col = cells.pop()
+        if board.get_number(row, col) != 2:
+            continue
+        zero = board.is_legal(row, col, 0)
+        one = board.is_legal(row, col, 1)
+        if not (zero or one):
+            return False
+        if zero != one:
+            board.place(row, col, int(one))
+            trail.append((row, col))
+            line = [(row, c) for c in range(board.len) if board.get_number(row, c) == 2]
+            column = [(r, col) for r in range(board.len) if board.get_number(r, col) == 2]
+            if not line or not column:
+                cells = board.empty_cells()
+            else:
+                cells += line + column
+    return True
+
+
+def depth_first_inplace_search(problem: Takuzu, max_nodes=None, rng=None):
+    """Depth-first search that works on a single copy of the board. Every
+    placement, both branching decisions and the forced cells propagated
+    after them, is recorded on a trail and undone when backtracking, so
+    no board is copied per node.
+    Each value tried at a branching decision counts as a node, and the
+    number of nodes is left in problem.nodes. If more than max_nodes are
+    needed, the search gives up and returns 'cutoff'. If rng, a
+    random.Random, is given, the values at each decision are tried in a
+    random order instead of 1 first.
+    Returns the goal Node, built by replaying every placement of the trail
+    from problem.initial without going through problem.result (whose
+    propagation could fill cells in another order), or None if there is
+    no solution."""
+    problem.nodes = 0
+    board = problem.initial.board.copy()
+    trail = []
+    if problem.initial.dead or not settle_in_place(board, board.empty_cells(), trail):
+        return None
+    # (trail length before the decision, row, col, values left to try)
+    choices = []
+    # Decisions are made on the first empty cell in row order, so every
+    # cell before the latest decision is filled and the scan resumes there.
+    n = board.len
+    cell = 0
+    while True:
+        while cell < n * n and board.get_number(*divmod(cell, n)) != 2:
+            cell += 1
+        if cell == n * n:
+            break
+        row, col = divmod(cell, n)
+        values = [0, 1]
+        if rng is not None:
+            rng.shuffle(values)
+        choices.append((len(trail), row, col, values))
+        while choices:
+            mark, row, col, values = choices[-1]
+            while len(trail) > mark:
+                board.remove(*trail.pop())
+            if not values:
+                choices.pop()
+                continue
+            val = values.pop()
+            problem.nodes += 1
+            if max_nodes is not None and problem.nodes > max_nodes:
+                return 'cutoff'
+            if board.is_legal(row, col, val):
+                board.place(row, col, val)
+                trail.append((row, col))
+                line = [(row, c) for c in range(n) if board.get_number(row, c) == 2]
+                column = [(r, col) for r in range(n) if board.get_number(r, col) == 2]
+                # A line just made full can force cells anywhere else
+                # through the uniqueness rule.
+                if not line or not column:
+                    line, column = board.empty_cells(), []
+                if settle_in_place(board, line + column, trail):
+                    break
+        else:
+            return None
+        cell = row * n + col
+
+    node = Node(problem.initial)
+    replay = problem.initial.board
+    for row, col in trail:
+        action = (row, col, board.get_number(row, col))
+        replay = replay.set_number(*action)
+        state = TakuzuState(replay)
+        node = Node(state, node, action,
+                    problem.path_cost(node.path_cost, node.state, action, state))
+    # Only called so that a wrapping InstrumentedProblem records the goal.
+    problem.goal_test(node.state)
+    return node
+
+
+def stack_children(pairs, n=0):
+    """Returns the (B, N, N) int8 array of the boards obtained by applying
+    each (board, (row, col, val)) pair. The boards can differ, e.g. the
+    children of a whole slice of the frontier, but must have the same
+    size. n is only needed to shape the (0, n, n) result of no pairs."""
+    pairs = list(pairs)
+    if pairs:
+        n = pairs[0][0].len
+    cells = bytearray().join(board.to_cells() for board, _ in pairs)
+    boards = np.frombuffer(cells, dtype=np.int8).reshape(len(pairs), n, n)
+    actions = np.array([action for _, action in pairs], dtype=np.intp).reshape(-1, 3)
+    boards[np.arange(len(pairs)), actions[:, 0], actions[:, 1]] = actions[:, 2]
+    return boards
+
+
+def check_boards(boards):
+    """Checks a (B, N, N) array of boards (0, 1 and 2 for empty) at once and
+    returns a boolean mask of the legal ones: no three equal values in a
+    row, at most N/2 (rounded up) of each value per line, and no two
+    equal full rows or columns."""
+    boards = np.asarray(boards, dtype=np.int8)
+    count, n = boards.shape[0], boards.shape[1]
+    limit = n // 2 + n % 2
+    legal = np.ones(count, dtype=bool)
+    other = ~np.eye(n, dtype=bool)
+    for lines in (boards, boards.transpose(0, 2, 1)):
+        first, middle, last = lines[:, :, :-2], lines[:, :, 1:-1], lines[:, :, 2:]
+        legal &= ~((first != 2) & (first == middle) & (middle == last)).any(axis=(1, 2))
+        legal &= ((lines == 0).sum(axis=2) <= limit).all(axis=1)
+        legal &= ((lines == 1).sum(axis=2) <= limit).all(axis=1)
+        full = (lines != 2).all(axis=2)
+        packed = np.packbits(lines == 1, axis=2)
+        same = (packed[:, :, None, :] == packed[:, None, :, :]).all(axis=3)
+        legal &= ~(same & full[:, :, None] & full[:, None, :] & other).any(axis=(1, 2))
+    return legal
+
+
 def heuristic(state: TakuzuState):
     board = state.board.board
     h = {}
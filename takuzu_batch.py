@@ -0,0 +1,200 @@
+"""Solves many Takuzu instances in a single process, so the interpreter
+start-up and the imports of search.py and utils.py are paid only once.
+
+Sources can be instance files, corpus files packed by takuzu_corpus.py,
+directories (every file inside, sorted), glob patterns, or '-' for a
+stream of concatenated instances on stdin.
+Every instance gets a result on stdout, separated by blank lines: a
+header line with its name and status (solved, no solution or timeout),
+then the solution in the tab-separated output format if there is one.
+With --compact each result is a single line instead. The time taken by
+each instance goes to stderr.
+
+With --jobs the instances are spread over a pool of worker processes.
+Only a compact encoding of each board (its size and one byte per cell)
+crosses the process boundary, and results are streamed back either in
+input order or, with --order completion, as soon as they are ready; the
+name in each result header tells which instance it belongs to.
+--timeout gives up on any instance that takes longer than that many
+seconds, so a single hard board cannot stall the pool.
+
+    $ python3 takuzu_batch.py testes-takuzu/inputs
+    $ python3 takuzu_batch.py 'testes-takuzu/inputs/input_T0*'
+    $ cat testes-takuzu/inputs/* | python3 takuzu_batch.py -
+    $ python3 takuzu_batch.py --jobs 4 --timeout 10 testes-takuzu/inputs
+"""
+
+import argparse
+import glob
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+from search import (
+    astar_search,
+    breadth_first_tree_search,
+    depth_first_tree_search,
+    depth_limited_search,
+)
+from takuzu import (BitBoard, Board, Takuzu, depth_first_inplace_search, format_cells,
+                    parse_cells)
+from takuzu_corpus import Corpus, is_corpus
+
+SEARCHERS = {
+    'inplace': depth_first_inplace_search,
+    'dfs': depth_first_tree_search,
+    'bfs': breadth_first_tree_search,
+    'dls': lambda problem: depth_limited_search(problem, problem.initial.board.len ** 2),
+    'astar': astar_search,
+}
+
+
+def source_files(source):
+    """Returns the instance files named by a file, directory or glob."""
+    if os.path.isdir(source):
+        return sorted(os.path.join(source, name) for name in os.listdir(source)
+                      if os.path.isfile(os.path.join(source, name)))
+    if os.path.isfile(source):
+        return [source]
+    files = sorted(glob.glob(source))
+    if not files:
+        raise FileNotFoundError("No instances found for " + repr(source))
+    return files
+
+
+def read_instances(sources):
+    """Yields (name, n, cells) for every instance in the given sources, see
+    parse_cells. Files holding several instances, corpora included, name
+    them file:1, file:2, ..."""
+    for source in sources:
+        if source == '-':
+            for index, (n, cells) in enumerate(parse_cells(sys.stdin.buffer), 1):
+                yield 'stdin:{}'.format(index), n, cells
+            continue
+        for path in source_files(source):
+            if is_corpus(path):
+                with Corpus(path) as corpus:
+                    for index in range(len(corpus)):
+                        name = path if len(corpus) == 1 else '{}:{}'.format(path, index + 1)
+                        yield (name,) + corpus.instance(index)
+                continue
+            with open(path, 'rb') as stream:
+                instances = list(parse_cells(stream))
+            for index, (n, cells) in enumerate(instances, 1):
+                yield (path if len(instances) == 1 else '{}:{}'.format(path, index)), n, cells
+
+
+def solve(board, searcher=depth_first_inplace_search):
+    """Returns the solved board, or None if board has no solution."""
+    goal = searcher(Takuzu(BitBoard.from_board(board)))
+    return goal.state.board if goal else None
+
+
+def encode(board):
+    """Returns (n, cells), cells holding one byte per cell, row by row."""
+    return board.len, board.to_cells()
+
+
+def decode(n, cells):
+    return Board.from_cells(n, cells)
+
+
+class SolveTimeout(Exception):
+    pass
+
+
+def raise_timeout(signum, frame):
+    raise SolveTimeout()
+
+
+def init_worker():
+    signal.signal(signal.SIGALRM, raise_timeout)
+
+
+def solve_encoded(task):
+    """Solves one (name, n, cells, search, timeout) task. Returns (name,
+    status, n, solution cells or None, elapsed seconds), status being
+    'solved', 'no solution' or 'timeout'."""
+    name, n, cells, search, timeout = task
+    start = time.perf_counter()
+    try:
+        try:
+            if timeout:
+                signal.setitimer(signal.ITIMER_REAL, timeout)
+            result = solve(decode(n, cells), SEARCHERS[search])
+        finally:
+            if timeout:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+        status = 'solved' if result is not None else 'no solution'
+    except SolveTimeout:
+        result, status = None, 'timeout'
+    elapsed = time.perf_counter() - start
+    return name, status, n, encode(result)[1] if result else None, elapsed
+
+
+def run_tasks(tasks, jobs=1, order='input'):
+    """Yields the results of solve_encoded for every task, in input order
+    or in completion order, using jobs worker processes."""
+    if jobs == 1:
+        previous = signal.signal(signal.SIGALRM, raise_timeout)
+        try:
+            yield from map(solve_encoded, tasks)
+        finally:
+            signal.signal(signal.SIGALRM, previous)
+        return
+    with multiprocessing.Pool(jobs, initializer=init_worker) as pool:
+        if order == 'completion':
+            yield from pool.imap_unordered(solve_encoded, tasks)
+        else:
+            yield from pool.imap(solve_encoded, tasks)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve many Takuzu instances in one process.")
+    parser.add_argument('sources', nargs='+',
+                        help="instance files, directories, glob patterns or - for stdin")
+    parser.add_argument('--search', choices=sorted(SEARCHERS), default='inplace',
+                        help="search algorithm (default: inplace)")
+    parser.add_argument('--jobs', type=int, default=1,
+                        help="number of worker processes, 0 for one per core (default: 1)")
+    parser.add_argument('--order', choices=['input', 'completion'], default='input',
+                        help="order in which results are written, each tagged with its instance name "
+                             "(default: input)")
+    parser.add_argument('--timeout', type=float, default=0,
+                        help="seconds allowed per instance, 0 for no limit (default: 0)")
+    parser.add_argument('--compact', action='store_true',
+                        help="write each solution as the digits on one line")
+    args = parser.parse_args(argv)
+
+    jobs = args.jobs or os.cpu_count()
+    try:
+        solve_all(read_instances(args.sources), args.search, jobs, args.order, args.timeout,
+                  args.compact)
+    except (FileNotFoundError, ValueError) as error:
+        parser.error(str(error))
+
+
+def solve_all(instances, search='inplace', jobs=1, order='input', timeout=0, compact=False):
+    """Solves every (name, n, cells) in instances, printing a result for
+    each to stdout and the time it took to stderr. A result is a
+    'name<TAB>status' header line followed by the solution, if any, and
+    results are separated by blank lines. If compact, each result is one
+    'name<TAB>status<TAB>digits' line, without digits if unsolved."""
+    tasks = ((name, n, cells, search, timeout) for name, n, cells in instances)
+    for index, (name, status, n, cells, elapsed) in enumerate(run_tasks(tasks, jobs, order)):
+        if compact:
+            fields = [name, status] + ([format_cells(n, cells, compact)] if cells is not None else [])
+            sys.stdout.write('\t'.join(fields) + '\n')
+        else:
+            if index:
+                sys.stdout.write('\n')
+            sys.stdout.write('{}\t{}\n'.format(name, status))
+            if cells is not None:
+                sys.stdout.write(format_cells(n, cells) + '\n')
+        print('{}\t{}\t{:.6f}'.format(name, status, elapsed), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
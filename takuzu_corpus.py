@@ -0,0 +1,161 @@
+"""Packed binary corpora of Takuzu instances, read through a memory map.
+
+A corpus file holds many instances in one file, so that loading them needs
+one open and no text parsing:
+
+    header   magic b'TKZC', version (u16), reserved (u16), count (u64)
+    index    count + 1 offsets (u64) from the start of the file; record i
+             spans offsets i to i + 1
+    records  the size N (u32), then the N*N cells row by row, 2 bits per
+             cell, four cells to a byte starting from the low bits
+
+All integers are little-endian. Corpus maps the file read-only and hands
+out PackedBoard views over the records, which copy nothing until the cells
+are unpacked, so opening a corpus is instant whatever its size and every
+process reading it shares the same pages.
+
+    $ python3 takuzu_corpus.py corpus.tkc testes-takuzu/inputs
+    $ python3 takuzu_batch.py corpus.tkc
+"""
+
+import argparse
+import mmap
+import struct
+
+from takuzu import Board
+
+MAGIC = b'TKZC'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQ')
+OFFSET = struct.Struct('<Q')
+SIZE = struct.Struct('<I')
+
+# The four cells packed in every possible byte, one byte per cell.
+UNPACKED = [bytes((byte >> shift) & 3 for shift in (0, 2, 4, 6)) for byte in range(256)]
+
+
+def pack(cells: bytes):
+    """Packs cell values 0, 1 and 2 into 2 bits each."""
+    cells = bytes(cells) + bytes(-len(cells) % 4)
+    return bytes(a | b << 2 | c << 4 | d << 6
+                 for a, b, c, d in zip(cells[0::4], cells[1::4], cells[2::4], cells[3::4]))
+
+
+def unpack(data, count: int):
+    """Returns the first count cell values packed in data, one byte each."""
+    return b''.join([UNPACKED[byte] for byte in data])[:count]
+
+
+def is_corpus(path):
+    """Tells whether the file at path starts with the corpus magic."""
+    with open(path, 'rb') as stream:
+        return stream.read(len(MAGIC)) == MAGIC
+
+
+def write_corpus(path, instances):
+    """Writes every (n, cells) in instances, as yielded by parse_cells, to a
+    corpus file at path. Returns the number of instances written."""
+    records = [SIZE.pack(n) + pack(cells) for n, cells in instances]
+    offset = HEADER.size + OFFSET.size * (len(records) + 1)
+    offsets = [offset]
+    for record in records:
+        offset += len(record)
+        offsets.append(offset)
+    with open(path, 'wb') as stream:
+        stream.write(HEADER.pack(MAGIC, VERSION, 0, len(records)))
+        stream.write(b''.join(OFFSET.pack(offset) for offset in offsets))
+        stream.writelines(records)
+    return len(records)
+
+
+class PackedBoard:
+    """A read-only view of one instance in a corpus. The cells stay packed
+    in the mapped file until cells() or board() is called."""
+
+    __slots__ = ('len', 'data')
+
+    def __init__(self, n: int, data: memoryview):
+        self.len = n
+        self.data = data
+
+    def get_number(self, row: int, col: int):
+        index = row * self.len + col
+        return (self.data[index >> 2] >> ((index & 3) << 1)) & 3
+
+    def cells(self):
+        """Returns the n*n cell values row by row, as read by
+        Board.from_cells."""
+        return unpack(self.data, self.len * self.len)
+
+    def board(self):
+        return Board.from_cells(self.len, self.cells())
+
+
+class Corpus:
+    """A corpus file mapped read-only into memory. Supports len(), indexing
+    and iteration, each giving a PackedBoard. Use it as a context manager,
+    or call close(), once no views are in use any more."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as stream:
+            self.map = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        if len(self.map) < HEADER.size:
+            self.close()
+            raise ValueError("{}: too short to be a Takuzu corpus".format(path))
+        magic, version, _, self.count = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("{}: not a version {} Takuzu corpus".format(path, VERSION))
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("corpus index out of range")
+        start, = OFFSET.unpack_from(self.map, HEADER.size + OFFSET.size * index)
+        end, = OFFSET.unpack_from(self.map, HEADER.size + OFFSET.size * (index + 1))
+        n, = SIZE.unpack_from(self.map, start)
+        return PackedBoard(n, self.view[start + SIZE.size:end])
+
+    def instance(self, index: int):
+        """Returns (n, cells) for the instance at index, as yielded by
+        parse_cells, without keeping a view into the file."""
+        board = self[index]
+        return board.len, board.cells()
+
+    def __iter__(self):
+        return (self[index] for index in range(self.count))
+
+    def close(self):
+        self.view.release()
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv=None):
+    from takuzu_batch import read_instances
+
+    parser = argparse.ArgumentParser(description="Pack Takuzu instance files into a corpus.")
+    parser.add_argument('output', help="corpus file to write")
+    parser.add_argument('sources', nargs='+',
+                        help="instance files, directories, glob patterns or - for stdin")
+    args = parser.parse_args(argv)
+
+    try:
+        count = write_corpus(args.output, ((n, cells) for _, n, cells in read_instances(args.sources)))
+    except (FileNotFoundError, ValueError) as error:
+        parser.error(str(error))
+    print("{} instances written to {}".format(count, args.output))
+
+
+if __name__ == "__main__":
+    main()
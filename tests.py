@@ -1,5 +1,19 @@
+import os
 import unittest as ut
 import takuzu as tz
+import search
+
+SOLUTION = "0\t1\t0\t1\n1\t0\t0\t1\n0\t1\t1\t0\n1\t0\t1\t0"
+
+
+def sample_rows():
+    """Fresh rows of a 4x4 instance whose only solution is SOLUTION."""
+    return [[2,2,0,1],[1,0,2,1],[0,2,1,0],[1,2,2,2]]
+
+
+# The cells of sample_rows() row by row, as yielded by parse_cells.
+SAMPLE_CELLS = bytes(cell for row in sample_rows() for cell in row)
+
 
 class TestBoard(ut.TestCase):
     def testIn(self):
@@ -83,5 +97,786 @@ class TestBoard(ut.TestCase):
         
 
 
+class TestBitBoard(ut.TestCase):
+    boards = [[[2,2,1,1],[1,0,2,1],[0,2,1,0],[1,2,1,2]],
+              [[1,1,1,1],[1,1,1,1],[0,2,1,0],[0,2,1,2]],
+              [[1,1,0,0],[1,1,0,0],[0,0,1,1],[0,0,1,1]],
+              [[2,1,0,0],[2,1,0,0],[2,0,1,1],[2,0,1,1]],
+              [[0,1,0,1],[1,0,1,0],[0,1,0,1],[1,0,1,0]],
+              [[1,1,1,0,1],[1,1,1,1,1],[0,2,1,0,1],[0,2,1,2,1],[0,0,1,1,0]],
+              [[1,1,0,2,2],[1,2,2,2,2],[0,2,2,2,2],[2,2,2,2,2],[2,2,2,2,2]]]
+
+    def testSameAsBoard(self):
+        for rows in self.boards:
+            bd = tz.Board(rows)
+            bb = tz.BitBoard.from_board(bd)
+            self.assertEqual(str(bb), str(bd))
+            self.assertEqual(list(bb.board), rows)
+            for number in (0, 1, 2):
+                self.assertEqual(number in bb, number in bd)
+            self.assertEqual(bb.check_lines(), bd.check_lines())
+            self.assertEqual(bb.check_cols(), bd.check_cols())
+            self.assertEqual(bb.check_adjacent(), bd.check_adjacent())
+            self.assertEqual(bb.check_over_half(), bd.check_over_half())
+            self.assertEqual(bb.full_board(), bd.full_board())
+            for row in range(bd.len):
+                for col in range(bd.len):
+                    self.assertEqual(bb.get_number(row, col), bd.get_number(row, col))
+                    self.assertEqual(bb.adjacent_vertical_numbers(row, col),
+                                     bd.adjacent_vertical_numbers(row, col))
+                    self.assertEqual(bb.adjacent_horizontal_numbers(row, col),
+                                     bd.adjacent_horizontal_numbers(row, col))
+            # Board.generate_possibilities uses board.index(row), which is
+            # only well defined when the rows are distinct.
+            if not bd.full_board() and bd.check_lines():
+                self.assertEqual(bb.generate_possibilities(), bd.generate_possibilities())
+
+    def testSetNumber(self):
+        bb = tz.BitBoard.from_rows(self.boards[0])
+        child = bb.set_number(0, 0, 0)
+        self.assertEqual(child.get_number(0, 0), 0)
+        self.assertEqual(bb.get_number(0, 0), 2)
+        self.assertEqual(child.counts[0][0], bb.counts[0][0] + 1)
+        self.assertEqual(child.counts[0][4], bb.counts[0][4] + 1)
+
+    def testSolve(self):
+        bd = tz.Board(sample_rows())
+        goal = tz.depth_first_tree_search(tz.Takuzu(tz.BitBoard.from_board(bd)))
+        self.assertEqual(str(goal.state.board), SOLUTION)
+
+
+class TestLocalCheck(ut.TestCase):
+    def fullScan(self, bd, action):
+        results = {mode: tz.Takuzu(bd, local_check=mode).patch_illegal(tz.TakuzuState(bd), [action])
+                   == [action] for mode in (False, 'scan', 'numpy')}
+        self.assertEqual(len(set(results.values())), 1, results)
+        return results[False]
+
+    def testSameAsFullScan(self):
+        rows = sample_rows()
+        for bd in (tz.Board(rows), tz.BitBoard.from_rows(rows)):
+            for row in range(4):
+                for col in range(4):
+                    if bd.get_number(row, col) == 2:
+                        for val in (0, 1):
+                            self.assertEqual(bd.is_legal(row, col, val),
+                                             self.fullScan(bd, (row, col, val)))
+
+    def testFullLine(self):
+        # the only way to fill row 1 is to duplicate row 0
+        rows = [[0,1,0,1],[0,1,0,2],[2,2,2,2],[2,2,2,2]]
+        for bd in (tz.Board(rows), tz.BitBoard.from_rows(rows)):
+            self.assertFalse(bd.is_legal(1, 3, 1))
+            self.assertFalse(bd.is_legal(1, 3, 0))
+            self.assertTrue(bd.is_legal(2, 0, 1))
+        # filling column 1 with a 0 duplicates column 0
+        rows = [[0,0,2,2,2,2],[1,1,2,2,2,2],[0,0,2,2,2,2],
+                [1,1,2,2,2,2],[1,1,2,2,2,2],[0,2,2,2,2,2]]
+        for bd in (tz.Board(rows), tz.BitBoard.from_rows(rows)):
+            self.assertFalse(bd.is_legal(5, 1, 0))
+            self.assertFalse(bd.is_legal(5, 1, 1))
+
+
+class TestPropagate(ut.TestCase):
+    def testRules(self):
+        # gap between equal values, pair of equal values, full count
+        rows = [[0,2,0,2,2,2],[2,2,2,1,1,2],[1,0,1,1,2,2],
+                [2,2,2,2,2,2],[2,2,2,2,2,2],[2,2,2,2,2,2]]
+        for bd in (tz.Board(rows), tz.BitBoard.from_rows(rows)):
+            res = tz.propagate(bd)
+            self.assertEqual(res.get_number(0, 1), 1)
+            self.assertEqual(res.get_number(1, 2), 0)
+            self.assertEqual(res.get_number(1, 5), 0)
+            self.assertEqual(res.get_number(2, 4), 0)
+            self.assertEqual(bd.get_number(0, 1), 2)
+
+    def testContradiction(self):
+        rows = [[0,0,2,1],[2,2,2,2],[2,2,2,2],[0,0,2,2]]
+        self.assertIsNone(tz.propagate(tz.Board(rows)))
+        self.assertTrue(tz.Takuzu(tz.BitBoard.from_rows(rows)).initial.dead)
+
+
+class TestCellHeap(ut.TestCase):
+    def testMostConstrainedFirst(self):
+        rows = [[0,2,0,2],[2,2,2,2],[2,2,2,2],[2,2,2,2]]
+        for bd in (tz.Board(rows), tz.BitBoard.from_rows(rows)):
+            cells = tz.CellHeap(bd)
+            self.assertEqual(cells.top(), (1, 0, 1))
+            cells.fill(bd, 0, 1, 1)
+            self.assertEqual(cells.top(), (1, 0, 3))
+
+    def testFailEarly(self):
+        rows = [[0,2,0,2],[2,1,2,2],[2,1,2,2],[2,2,2,2]]
+        cells = tz.CellHeap(tz.BitBoard.from_rows(rows))
+        self.assertEqual(cells.top(), (0, 0, 1))
+
+    def testActions(self):
+        rows = [[2,2,2,2],[2,2,2,2],[2,2,2,2],[2,2,2,2]]
+        problem = tz.Takuzu(tz.BitBoard.from_rows(rows))
+        self.assertEqual(len(problem.actions(problem.initial)), 2)
+        goal = tz.depth_first_tree_search(problem)
+        self.assertTrue(goal.state.board.full_board())
+        self.assertTrue(goal.state.board.check_lines() and goal.state.board.check_cols())
+
+
+class TestInplaceSearch(ut.TestCase):
+    def testSolvesWithBacktracking(self):
+        rows = [[2] * 6 for _ in range(6)]
+        for kwargs in ({}, {'propagation': False, 'mrv': False}):
+            bd = tz.BitBoard.from_rows(rows)
+            problem = tz.Takuzu(bd, **kwargs)
+            goal = tz.depth_first_inplace_search(problem)
+            self.assertTrue(problem.goal_test(goal.state))
+            board = goal.state.board
+            self.assertTrue(board.check_lines() and board.check_cols())
+            self.assertTrue(board.check_adjacent() and board.check_over_half())
+            self.assertEqual(bd.empty_cells(), problem.initial.board.empty_cells())
+
+    def testRemove(self):
+        bb = tz.BitBoard.from_rows(sample_rows())
+        before = str(bb), bb.counts
+        bb.place(0, 0, 1)
+        bb.remove(0, 0)
+        self.assertEqual((str(bb), bb.counts), before)
+
+    def testNoSolution(self):
+        rows = [[0,1,0,1],[0,1,0,2],[2,2,2,2],[2,2,2,2]]
+        self.assertIsNone(tz.depth_first_inplace_search(tz.Takuzu(tz.Board(rows), mrv=False, propagation=False)))
+
+    def testOddFullLine(self):
+        # a decision completes a line, which forces cells elsewhere
+        rows = [[2,2,2,2,2,2,1],[2,0,2,1,2,2,2],[2,0,1,2,2,2,2],[2,2,2,2,2,0,2],
+                [2,0,2,2,1,1,2],[1,2,2,2,2,0,2],[1,0,2,1,0,2,0]]
+        for kwargs in ({}, {'mrv': False}, {'propagation': False, 'mrv': False}):
+            for bd in (tz.Board([row[:] for row in rows]), tz.BitBoard.from_rows(rows)):
+                goal = tz.depth_first_inplace_search(tz.Takuzu(bd, **kwargs))
+                board = goal.state.board
+                self.assertTrue(board.full_board() and board.check_over_half())
+                self.assertTrue(board.check_lines() and board.check_cols() and board.check_adjacent())
+                self.assertEqual(board.zobrist, tz.Board.from_cells(7, board.to_cells()).zobrist)
+
+
+class TestStateEquality(ut.TestCase):
+    def testFillOrder(self):
+        rows = sample_rows()
+        for bd in (tz.Board(rows), tz.BitBoard.from_rows(rows)):
+            problem = tz.Takuzu(bd, propagation=False, mrv=False)
+            s = problem.initial
+            a, b = (0, 0, 0), (1, 2, 0)
+            ab = problem.result(problem.result(s, a), b)
+            ba = problem.result(problem.result(s, b), a)
+            self.assertIsNot(ab, ba)
+            self.assertEqual(ab, ba)
+            self.assertEqual(hash(ab), hash(ba))
+            self.assertEqual(len({s, ab, ba}), 2)
+            self.assertNotEqual(ab, problem.result(s, a))
+            self.assertEqual(tz.Node(ab), tz.Node(ba))
+
+
+class TestZobrist(ut.TestCase):
+    def testIncremental(self):
+        rows = sample_rows()
+        bd, bb = tz.Board([list(r) for r in rows]), tz.BitBoard.from_rows(rows)
+        self.assertEqual(bd.zobrist, bb.zobrist)
+        for board in (bd, bb):
+            board.place(0, 0, 0)
+            board.place(3, 3, 1)
+            board.remove(0, 0)
+        expected = tz.Board([[2,2,0,1],[1,0,2,1],[0,2,1,0],[1,2,2,1]]).zobrist
+        self.assertEqual(bd.zobrist, expected)
+        self.assertEqual(bb.zobrist, expected)
+        self.assertEqual(hash(tz.TakuzuState(bb)), hash(expected))
+        self.assertEqual(hash(tz.Node(tz.TakuzuState(bd))), hash(expected))
+        copy = bd.set_number(0, 0, 0)
+        self.assertEqual(copy.zobrist, tz.Board(copy.board).zobrist)
+
+
+class AllCellsTakuzu(tz.Takuzu):
+    """Offers every legal placement, so many orders reach the same board."""
+    def actions(self, state):
+        return [(row, col, val) for row, col in state.board.empty_cells()
+                for val in (0, 1) if state.board.is_legal(row, col, val)]
+
+
+class TestTransposition(ut.TestCase):
+    rows = [[0,1,0,2],[1,0,2,2],[2,2,1,2],[0,1,0,2]]
+
+    def testPrunesDeadSubtrees(self):
+        plain = search.InstrumentedProblem(
+            AllCellsTakuzu(tz.BitBoard.from_rows(self.rows), propagation=False, mrv=False))
+        self.assertIsNone(search.depth_first_tree_search(plain))
+        for policy in ('lru', 'depth'):
+            tt = search.TranspositionProblem(
+                AllCellsTakuzu(tz.BitBoard.from_rows(self.rows), propagation=False, mrv=False),
+                maxsize=50, policy=policy)
+            problem = search.InstrumentedProblem(tt)
+            self.assertIsNone(search.depth_first_tree_search(problem))
+            self.assertLess(problem.states, plain.states)
+            self.assertGreater(tt.hits, 0)
+            self.assertLessEqual(len(tt.dead), 50)
+            self.assertLessEqual(len(tt.seen), 50)
+
+    def testFindsSolution(self):
+        rows = sample_rows()
+        tt = search.TranspositionProblem(
+            AllCellsTakuzu(tz.BitBoard.from_rows(rows), propagation=False, mrv=False))
+        goal = search.depth_limited_search(tt, 16)
+        self.assertEqual(str(goal.state.board), SOLUTION)
+
+    def testDepthCutoffIsNotDead(self):
+        graph = search.Graph(dict(R=dict(X=1, Y=1), X=dict(P=1), Y=dict(P=1),
+                                  P=dict(A=1, B=1), B=dict(C=1), C=dict(D=1), D=dict(G=1)))
+        tt = search.TranspositionProblem(search.GraphProblem('R', 'G', graph))
+        self.assertEqual(search.depth_limited_search(tt, 4), 'cutoff')
+        self.assertIn(hash('A'), tt.dead)
+        self.assertNotIn(hash('P'), tt.dead)
+        self.assertEqual(search.depth_limited_search(tt, 10).state, 'G')
+
+    def testTable(self):
+        table = search.TranspositionTable(2, 'lru')
+        table.add('a')
+        table.add('b')
+        self.assertTrue('a' in table)
+        table.add('c')
+        self.assertEqual(set(table.entries), {'a', 'c'})
+        table = search.TranspositionTable(2, 'depth')
+        table.add('a', 1)
+        table.add('b', 5)
+        table.add('c', 9)
+        table.add('d', 2)
+        self.assertEqual(set(table.entries), {'a', 'd'})
+        self.assertRaises(ValueError, search.TranspositionTable, 2, 'fifo')
+
+
+class TestBatch(ut.TestCase):
+    def testParseInstances(self):
+        import io
+        text = "2\n1\t2\n2\t2\n\n4\n2\t2\t0\t1\n1\t0\t2\t1\n0\t2\t1\t0\n1\t2\t2\t2\n"
+        boards = list(tz.Board.parse_instances(io.StringIO(text)))
+        self.assertEqual([b.len for b in boards], [2, 4])
+        self.assertEqual(boards[1].board[3], [1, 2, 2, 2])
+
+    def testSolve(self):
+        import takuzu_batch
+        bd = tz.Board(sample_rows())
+        for searcher in takuzu_batch.SEARCHERS.values():
+            self.assertEqual(str(takuzu_batch.solve(bd, searcher)),
+                             SOLUTION)
+
+
+class TestParallelBatch(ut.TestCase):
+    def testEncode(self):
+        import takuzu_batch
+        bd = tz.Board(sample_rows())
+        n, cells = takuzu_batch.encode(bd)
+        self.assertEqual((n, len(cells)), (4, 16))
+        self.assertEqual(str(takuzu_batch.decode(n, cells)), str(bd))
+
+    def testRunTasks(self):
+        import takuzu_batch
+        bd = tz.Board(sample_rows())
+        bad = tz.Board(([0,1,0,1],[0,1,0,2],[2,2,2,2],[2,2,2,2]))
+        tasks = [(str(i),) + takuzu_batch.encode(b) + ('dfs', 5) for i, b in enumerate([bd, bad, bd])]
+        for jobs, order in ((1, 'input'), (2, 'input'), (2, 'completion')):
+            results = list(takuzu_batch.run_tasks(tasks, jobs, order))
+            if order == 'input':
+                self.assertEqual([r[0] for r in results], ['0', '1', '2'])
+            statuses = {name: status for name, status, _, _, _ in results}
+            self.assertEqual(statuses, {'0': 'solved', '1': 'no solution', '2': 'solved'})
+
+    def testSolveAll(self):
+        import contextlib, io
+        import takuzu_batch
+        bad = tz.Board(([0,1,0,1],[0,1,0,2],[2,2,2,2],[2,2,2,2]))
+        instances = [(name,) + takuzu_batch.encode(b)
+                     for name, b in (('a', tz.Board(sample_rows())), ('b', bad), ('c', tz.Board(sample_rows())))]
+        out, err = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            takuzu_batch.solve_all(instances)
+            takuzu_batch.solve_all(instances, compact=True)
+        solved = SOLUTION + "\n"
+        compact = SOLUTION.replace("\t", "").replace("\n", "")
+        self.assertEqual(out.getvalue(),
+                         "a\tsolved\n" + solved + "\nb\tno solution\n\nc\tsolved\n" + solved
+                         + "a\tsolved\t" + compact + "\nb\tno solution\nc\tsolved\t" + compact + "\n")
+
+    def testSolveAllCompletionOrder(self):
+        import contextlib, io
+        import takuzu_batch
+        bad = tz.Board(([0,1,0,1],[0,1,0,2],[2,2,2,2],[2,2,2,2]))
+        boards = [tz.Board(sample_rows()), bad] * 3
+        instances = [(str(i),) + takuzu_batch.encode(b) for i, b in enumerate(boards)]
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(io.StringIO()):
+            takuzu_batch.solve_all(instances, 'dfs', jobs=2, order='completion')
+        results = {}
+        for block in out.getvalue().split("\n\n"):
+            header, _, board = block.partition("\n")
+            name, status = header.split("\t")
+            results[name] = status, board.rstrip("\n")
+        self.assertEqual(results, {str(i): ('solved', SOLUTION) if i % 2 == 0 else ('no solution', '')
+                                   for i in range(6)})
+
+
+def failing_search(problem):
+    raise RuntimeError("searcher failed")
+
+
+def crashing_search(problem):
+    os._exit(1)
+
+
+class TestPortfolio(ut.TestCase):
+    def testFirstSolution(self):
+        rows = sample_rows()
+        problem = tz.Takuzu(tz.BitBoard.from_rows(rows), propagation=False, mrv=False)
+        goal = search.portfolio_search(problem, [search.depth_first_tree_search,
+                                                 search.breadth_first_tree_search,
+                                                 (search.depth_first_tree_search, tz.Takuzu(tz.Board(rows)))])
+        self.assertEqual(str(goal.state.board), SOLUTION)
+
+    def testNoSolution(self):
+        rows = [[0,1,0,1],[0,1,0,2],[2,2,2,2],[2,2,2,2]]
+        problem = tz.Takuzu(tz.BitBoard.from_rows(rows), propagation=False, mrv=False)
+        self.assertIsNone(search.portfolio_search(problem, [search.depth_first_tree_search,
+                                                            search.depth_limited_search]))
+
+    def testFailingSearchers(self):
+        rows = sample_rows()
+        problem = tz.Takuzu(tz.BitBoard.from_rows(rows), propagation=False, mrv=False)
+        self.assertIsNone(search.portfolio_search(problem, [failing_search, crashing_search]))
+        goal = search.portfolio_search(problem, [failing_search, crashing_search,
+                                                 search.depth_first_tree_search])
+        self.assertTrue(problem.goal_test(goal.state))
+
+
+class TestParallelDFS(ut.TestCase):
+    def testSameAnswerAsDFS(self):
+        rows = [[0,1,0,1,0,2],[2]*6,[2]*6,[2]*6,[2]*6,[0,1,0,1,0,2]]
+        problem = tz.Takuzu(tz.BitBoard.from_rows(rows), propagation=False, mrv=False)
+        self.assertIsNone(search.depth_first_tree_search(problem))
+        self.assertIsNone(search.parallel_depth_first_tree_search(problem, 2, split=1, check_every=4))
+        rows[5] = [1,0,1,0,1,2]
+        problem = tz.Takuzu(tz.BitBoard.from_rows(rows), propagation=False, mrv=False)
+        goal = search.parallel_depth_first_tree_search(problem, 2, split=1, check_every=4)
+        self.assertTrue(problem.goal_test(goal.state))
+        self.assertTrue(goal.state.board.check_lines() and goal.state.board.check_cols())
+
+    def testFailingWorker(self):
+        with self.assertRaises(RuntimeError):
+            search.parallel_depth_first_tree_search(FailingProblem(0, 100), 2, split=1, check_every=4)
+
+
+class TestPriorityQueue(ut.TestCase):
+    def testIndexed(self):
+        import utils
+        pq = utils.PriorityQueue('min', lambda x: x[1])
+        pq.extend([('a', 3), ('b', 1), ('c', 2)])
+        self.assertEqual(len(pq), 3)
+        self.assertTrue(('a', 3) in pq)
+        self.assertEqual(pq[('c', 2)], 2)
+        del pq[('b', 1)]
+        self.assertFalse(('b', 1) in pq)
+        self.assertEqual(len(pq), 2)
+        self.assertRaises(KeyError, pq.__getitem__, ('b', 1))
+        self.assertRaises(KeyError, pq.__delitem__, ('b', 1))
+        self.assertEqual(pq.pop(), ('c', 2))
+        self.assertEqual(pq.pop(), ('a', 3))
+        self.assertEqual(len(pq), 0)
+        self.assertRaises(Exception, pq.pop)
+
+    def testDecreaseKey(self):
+        import utils
+        f = {'a': 5, 'b': 3}
+        pq = utils.PriorityQueue('min', lambda x: f[x])
+        pq.extend(['a', 'b'])
+        f['a'] = 1
+        del pq['a']
+        pq.append('a')
+        self.assertEqual(pq['a'], 1)
+        self.assertEqual([pq.pop(), pq.pop()], ['a', 'b'])
+
+
+class TestTieBreaking(ut.TestCase):
+    class Opaque:
+        """Items that cannot be ordered."""
+        def __init__(self, depth):
+            self.depth = depth
+
+    def testTies(self):
+        import utils
+        items = [self.Opaque(d) for d in (1, 3, 2)]
+        for tie, expected in (('fifo', [1, 3, 2]), ('lifo', [2, 3, 1]),
+                              (lambda x: -x.depth, [3, 2, 1])):
+            pq = utils.PriorityQueue('min', lambda x: 0, tie)
+            pq.extend(items)
+            self.assertEqual([pq.pop().depth for _ in items], expected)
+        self.assertRaises(ValueError, utils.PriorityQueue, 'min', lambda x: 0, 'random')
+
+    def testTakuzuStatesNotCompared(self):
+        rows = sample_rows()
+        problem = tz.Takuzu(tz.BitBoard.from_rows(rows), propagation=False, mrv=False)
+        self.assertRaises(TypeError, lambda: problem.initial < problem.initial)
+        goal = search.astar_search(problem)
+        self.assertEqual(str(goal.state.board), SOLUTION)
+
+
+class TestGraphSearch(ut.TestCase):
+    def testFrontierSets(self):
+        import io, contextlib
+        rows = sample_rows()
+        for searcher in (search.depth_first_graph_search, search.breadth_first_graph_search):
+            problem = AllCellsTakuzu(tz.BitBoard.from_rows(rows), propagation=False, mrv=False)
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                goal = searcher(problem, display=True)
+            self.assertEqual(str(goal.state.board), SOLUTION)
+            self.assertIn("peak frontier size:", out.getvalue())
+
+
+class CountProblem(search.Problem):
+    """Count up from initial to goal, one or two at a time."""
+    def actions(self, state):
+        return [1, 2] if state < self.goal else []
+
+    def result(self, state, action):
+        return state + action
+
+
+class FailingProblem(CountProblem):
+    """Fails once the search gets past 5."""
+    def result(self, state, action):
+        if state > 5:
+            raise ValueError("state out of range")
+        return state + action
+
+
+class TestIterativeDLS(ut.TestCase):
+    def testDeep(self):
+        problem = CountProblem(0, 5000)
+        goal = search.depth_limited_search(problem, 6000)
+        self.assertEqual(goal.depth, 5000)
+        self.assertEqual(search.depth_limited_search(CountProblem(0, 7), 3), 'cutoff')
+        self.assertIsNone(search.depth_limited_search(CountProblem(0, 1.5), 10))
+
+    def testIterativeDeepening(self):
+        problem = search.InstrumentedProblem(CountProblem(0, 9))
+        goal = search.iterative_deepening_search(problem)
+        self.assertEqual(goal.depth, 5)
+        self.assertEqual(goal.solution(), [1, 2, 2, 2, 2])
+        # the levels above depth 5 are searched again at every iteration
+        self.assertLess(problem.goal_tests, 1 + 3 + 7 + 15 + 31 + 63)
+        rows = sample_rows()
+        goal = search.iterative_deepening_search(tz.Takuzu(tz.Board(rows), propagation=False))
+        self.assertEqual(str(goal.state.board), SOLUTION)
+
+
+class TestLazyExpand(ut.TestCase):
+    def testOnlyBuildsVisitedChildren(self):
+        for searcher in (search.depth_first_tree_search,
+                         lambda p: search.depth_limited_search(p, 10)):
+            problem = search.InstrumentedProblem(CountProblem(0, 3))
+            goal = searcher(problem)
+            self.assertEqual(goal.solution(), [1, 1, 1])
+            self.assertEqual(problem.states, 3)
+
+    def testExpandLazily(self):
+        node = search.Node(0)
+        children = node.expand_lazily(CountProblem(0, 3))
+        self.assertEqual(next(children).state, 1)
+        self.assertEqual([n.state for n in children], [2])
+
+
+class TestSlottedNode(ut.TestCase):
+    def testSlots(self):
+        node = search.Node(0)
+        self.assertFalse(hasattr(node, '__dict__'))
+        self.assertRaises(AttributeError, setattr, node, 'other', 1)
+        f = search.memoize(lambda n: n.depth + 1, 'f')
+        child = search.Node(1, node, 1, 1)
+        self.assertFalse(hasattr(child, 'f'))
+        self.assertEqual(f(child), 2)
+        self.assertEqual(child.f, 2)
+        self.assertEqual(child.path(), [node, child])
+        self.assertEqual(child.solution(), [1])
+
+
+def live_nodes():
+    import gc
+    return sum(isinstance(o, search.Node) for o in gc.get_objects())
+
+
+class LiveNodesPuzzle(search.EightPuzzle):
+    """Records the most Node objects alive at once, sampled every 100 calls."""
+    calls = peak = 0
+
+    def actions(self, state):
+        self.calls += 1
+        if self.calls % 100 == 0:
+            self.peak = max(self.peak, live_nodes())
+        return super().actions(state)
+
+
+class TestSMAStar(ut.TestCase):
+    def testMemoryBound(self):
+        problem = search.GraphProblem('Arad', 'Bucharest', search.romania_map)
+        self.assertEqual(search.sma_star_search(problem, 100).path_cost,
+                         search.astar_search(problem).path_cost)
+        # the optimal path needs 5 nodes in memory, so with 4 only a worse one fits
+        self.assertEqual(search.sma_star_search(problem, 5).path_cost, 418)
+        self.assertEqual(search.sma_star_search(problem, 4).path_cost, 450)
+        self.assertIsNone(search.sma_star_search(problem, 3))
+
+    def testRegeneratesForgottenBranches(self):
+        # the best path T-A-S-R-P-B needs 6 nodes, T-A-S-F-B only 5
+        problem = search.GraphProblem('Timisoara', 'Bucharest', search.romania_map)
+        self.assertEqual(search.astar_search(problem).path_cost, 536)
+        self.assertEqual(search.sma_star_search(problem, 6).path_cost, 536)
+        self.assertEqual(search.sma_star_search(problem, 5).path_cost, 568)
+        self.assertIsNone(search.sma_star_search(problem, 4))
+
+    def testLiveNodes(self):
+        # forgotten branches are generated again many times here
+        problem = LiveNodesPuzzle((7, 4, 3, 8, 1, 5, 2, 6, 0))
+        before = live_nodes()
+        goal = search.sma_star_search(problem, 100)
+        self.assertEqual(goal.path_cost, 14)
+        self.assertGreater(problem.calls, 1000)
+        # the budget, plus the children of the node being expanded
+        self.assertLessEqual(problem.peak - before, 100 + 4)
+
+    def testTakuzu(self):
+        rows = sample_rows()
+        goal = search.sma_star_search(tz.Takuzu(tz.BitBoard.from_rows(rows), propagation=False), 20)
+        self.assertEqual(str(goal.state.board), SOLUTION)
+
+
+class TestBeamAndAnytime(ut.TestCase):
+    def testRomania(self):
+        problem = search.GraphProblem('Arad', 'Bucharest', search.romania_map)
+        self.assertEqual(search.beam_search(problem, 1).path_cost, 450)
+        self.assertEqual(search.anytime_weighted_astar_search(problem, 3).path_cost, 418)
+        # out of time right away: nothing found yet
+        self.assertIsNone(search.anytime_weighted_astar_search(problem, 3, time_limit=-1))
+
+    def testHeuristicProblems(self):
+        puzzle = search.EightPuzzle((2,4,3,1,5,6,7,8,0))
+        self.assertEqual(len(search.anytime_weighted_astar_search(puzzle, 5).solution()), 8)
+        self.assertTrue(puzzle.goal_test(search.beam_search(puzzle, 5).state))
+        rows = sample_rows()
+        for searcher in (search.beam_search, search.anytime_weighted_astar_search):
+            goal = searcher(tz.Takuzu(tz.BitBoard.from_rows(rows), propagation=False))
+            self.assertEqual(str(goal.state.board), SOLUTION)
+
+
+class TestCheckBoards(ut.TestCase):
+    def reference(self, rows):
+        bd = tz.BitBoard.from_rows(rows)
+        full_rows = [r for r in rows if 2 not in r]
+        full_cols = [c for c in zip(*rows) if 2 not in c]
+        return (bd.check_adjacent() and bd.check_over_half()
+                and len(set(map(tuple, full_rows))) == len(full_rows)
+                and len(set(full_cols)) == len(full_cols))
+
+    def testSameAsBoardRules(self):
+        import random
+        rng = random.Random(3)
+        for n in (4, 5, 6):
+            boards = [[[rng.choice((0, 1, 2, 2)) for _ in range(n)] for _ in range(n)]
+                      for _ in range(300)]
+            boards += [[[0,1] * (n // 2) + [0] * (n % 2)] * n]
+            mask = tz.check_boards(boards)
+            self.assertEqual(list(mask), [self.reference(b) for b in boards])
+            self.assertTrue(mask.any() and not mask.all())
+
+    def testStackChildren(self):
+        bd = tz.Board(sample_rows())
+        actions = [(0, 0, 0), (0, 0, 1), (3, 3, 1)]
+        children = tz.stack_children((bd, action) for action in actions)
+        self.assertEqual(children.shape, (3, 4, 4))
+        self.assertEqual(children[2].tolist(), [[2,2,0,1],[1,0,2,1],[0,2,1,0],[1,2,2,1]])
+        self.assertEqual(list(tz.check_boards(children)),
+                         [bd.is_legal(*action) for action in actions])
+        empty = tz.stack_children([], 4)
+        self.assertEqual(empty.shape, (0, 4, 4))
+        self.assertEqual(tz.check_boards(empty).shape, (0,))
+
+
+class TestParseCells(ut.TestCase):
+    text = b"2\n1\t2\n2\t2\n\n4\r\n2 2 0 1\r\n1\t0\t2\t1\r\n0210\r\n1\t2\t2\t2\r\n"
+
+    def testBytes(self):
+        self.assertEqual(list(tz.parse_cells(self.text)),
+                         [(2, bytes([1,2,2,2])), (4, SAMPLE_CELLS)])
+
+    def testStreams(self):
+        import io, mmap, tempfile
+        expected = list(tz.parse_cells(self.text))
+        self.assertEqual(list(tz.parse_cells(io.BytesIO(self.text))), expected)
+        self.assertEqual(list(tz.parse_cells(io.StringIO(self.text.decode()))), expected)
+        with tempfile.TemporaryFile() as f:
+            f.write(self.text)
+            f.flush()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                self.assertEqual(list(tz.parse_cells(m)), expected)
+
+    def testErrors(self):
+        for text, message in ((b"x\n", "line 1"), (b"0\n", "positive"),
+                              (b"2\n0\t1\n", "end of input"),
+                              (b"2\n0\t1\n1\n", "line 3: expected 2 cells"),
+                              (b"2\n0\t1\n1\t3\n", "line 3: cells must be")):
+            with self.assertRaisesRegex(ValueError, message):
+                list(tz.parse_cells(text))
+
+    def testFromCells(self):
+        bd = tz.Board.from_cells(2, bytes([1,2,2,0]))
+        self.assertEqual(bd.board, ([1,2],[2,0]))
+
+
+class TestFormatCells(ut.TestCase):
+    def testFormats(self):
+        cells = bytes([0,1,2,1,0,2,2,2,1])
+        self.assertEqual(tz.format_cells(3, cells), "0\t1\t2\n1\t0\t2\n2\t2\t1")
+        self.assertEqual(tz.format_cells(3, cells, compact=True), "012102221")
+        self.assertEqual(tz.format_cells(1, b'\x01'), "1")
+
+    def testBoards(self):
+        bd = tz.Board(sample_rows())
+        self.assertEqual(str(bd), "2\t2\t0\t1\n1\t0\t2\t1\n0\t2\t1\t0\n1\t2\t2\t2")
+        self.assertEqual(str(tz.BitBoard.from_board(bd)), str(bd))
+        self.assertEqual(bd.to_cells(), SAMPLE_CELLS)
+        self.assertEqual(list(tz.Board.from_cells(4, SAMPLE_CELLS).board), bd.board)
+
+
+class TestCorpus(ut.TestCase):
+    instances = [(2, bytes([1,2,2,0])), (3, bytes([0,1,2,1,0,2,2,2,1])),
+                 (4, SAMPLE_CELLS)]
+
+    def setUp(self):
+        import os, tempfile
+        fd, self.path = tempfile.mkstemp(suffix='.tkc')
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+
+    def testPack(self):
+        import takuzu_corpus as tc
+        for n, cells in self.instances:
+            self.assertEqual(len(tc.pack(cells)), (n * n + 3) // 4)
+            self.assertEqual(tc.unpack(tc.pack(cells), n * n), cells)
+
+    def testRoundTrip(self):
+        import takuzu_corpus as tc
+        self.assertEqual(tc.write_corpus(self.path, self.instances), 3)
+        self.assertTrue(tc.is_corpus(self.path))
+        with tc.Corpus(self.path) as corpus:
+            self.assertEqual(len(corpus), 3)
+            self.assertEqual([corpus.instance(i) for i in range(3)], self.instances)
+            self.assertEqual(corpus.instance(-1), self.instances[2])
+            board = corpus[1]
+            self.assertEqual([board.get_number(r, c) for r in range(3) for c in range(3)],
+                             list(self.instances[1][1]))
+            self.assertEqual(board.board().board, ([0,1,2],[1,0,2],[2,2,1]))
+            del board
+            with self.assertRaises(IndexError):
+                corpus[3]
+
+    def testNotACorpus(self):
+        import takuzu_corpus as tc
+        with open(self.path, 'wb') as stream:
+            stream.write(b"2\n1\t2\n2\t2\n")
+        self.assertFalse(tc.is_corpus(self.path))
+        with self.assertRaises(ValueError):
+            tc.Corpus(self.path)
+
+    def testBatch(self):
+        import takuzu_batch
+        import takuzu_corpus as tc
+        tc.write_corpus(self.path, self.instances)
+        names = ['{}:{}'.format(self.path, i) for i in (1, 2, 3)]
+        self.assertEqual(list(takuzu_batch.read_instances([self.path])),
+                         [(name,) + instance for name, instance in zip(names, self.instances)])
+
+
+class TestGenerator(ut.TestCase):
+    @staticmethod
+    def valid(board):
+        bd = tz.Board(board.board)
+        return (bd.full_board() and bd.check_lines() and bd.check_cols()
+                and bd.check_adjacent() and bd.check_over_half())
+
+    def testSolutions(self):
+        import random
+        import random_takuzu as rt
+        rng = random.Random(1)
+        for n in (1, 2, 3, 4, 5, 6, 7, 10, 11):
+            self.assertTrue(self.valid(rt.random_solution(n, rng)))
+
+    def testUnique(self):
+        import itertools, random
+        import random_takuzu as rt
+        for seed in range(3):
+            board = rt.generate(4, random.Random(seed))
+            empty = board.empty_cells()
+            solutions = 0
+            for values in itertools.product((0, 1), repeat=len(empty)):
+                full = board.copy()
+                for (row, col), val in zip(empty, values):
+                    full.place(row, col, val)
+                solutions += self.valid(full)
+            self.assertEqual(solutions, 1)
+
+    def testSeed(self):
+        import random
+        import random_takuzu as rt
+        boards = [rt.generate(6, random.Random(7)).to_cells() for _ in range(2)]
+        self.assertEqual(boards[0], boards[1])
+
+    def testTargets(self):
+        import random
+        import random_takuzu as rt
+        board = rt.generate(8, random.Random(1), depth=4)
+        self.assertGreaterEqual(rt.difficulty(board)[1], 4)
+        board = rt.generate(8, random.Random(1), nodes=10)
+        self.assertGreaterEqual(rt.difficulty(board)[0], 10)
+
+    def testOddTargets(self):
+        import random
+        import random_takuzu as rt
+        for n, nodes, depth in ((7, 0, 3), (9, 4, 0), (11, 4, 2)):
+            board = rt.generate(n, random.Random(4), nodes, depth)
+            found = rt.difficulty(board)
+            self.assertTrue(found[0] >= nodes and found[1] >= depth)
+            goal = tz.depth_first_inplace_search(tz.Takuzu(board))
+            self.assertTrue(self.valid(goal.state.board))
+
+    def testSearchLimits(self):
+        import random
+        bd = tz.BitBoard.from_rows([[2] * 6 for _ in range(6)])
+        problem = tz.Takuzu(bd)
+        self.assertEqual(tz.depth_first_inplace_search(problem, 2), 'cutoff')
+        self.assertEqual(problem.nodes, 3)
+        goal = tz.depth_first_inplace_search(problem, rng=random.Random(3))
+        self.assertTrue(self.valid(goal.state.board))
+
+    def testMain(self):
+        import contextlib, io, os, tempfile
+        import random_takuzu as rt
+        import takuzu_corpus as tc
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(io.StringIO()):
+            rt.main(['5', '--count', '2', '--seed', '3'])
+        self.assertEqual([n for n, _ in tz.parse_cells(out.getvalue().encode())], [5, 5])
+        fd, path = tempfile.mkstemp(suffix='.tkc')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        with contextlib.redirect_stderr(io.StringIO()):
+            rt.main(['5', '--count', '2', '--seed', '3', '--corpus', path])
+        with tc.Corpus(path) as corpus:
+            self.assertEqual([corpus.instance(i) for i in range(2)],
+                             list(tz.parse_cells(out.getvalue().encode())))
+
+
+
+
 if __name__ == "__main__":
     ut.main()
\ No newline at end of file
@@ -5,6 +5,7 @@ import collections
 import collections.abc
 import functools
 import heapq
+import itertools
 import operator
 import os.path
 import random
@@ -724,10 +725,29 @@ class PriorityQueue:
     order) is returned first.
     If order is 'min', the item with minimum f(x) is
     returned first; if order is 'max', then it is the item with maximum f(x).
-    Also supports dict-like lookup."""
-
-    def __init__(self, order='min', f=lambda x: x):
+    Also supports dict-like lookup.
+    Besides the heap, an index maps each item to its heap entries, so
+    membership and lookup are O(1). Deleting an item only marks its entry
+    as dead (it is dropped when it reaches the top of the heap), so
+    decreasing a key with del + append is O(log n). Items must be hashable.
+    Heap entries are [value, tie key, sequence number, item, alive]. Items
+    with equal f(x) come out in insertion order if tie is 'fifo', most
+    recent first if tie is 'lifo', and by tie(x) (then insertion order)
+    if tie is a function, e.g. lambda node: -node.depth. The sequence
+    number is unique, so the items themselves are never compared."""
+
+    def __init__(self, order='min', f=lambda x: x, tie='fifo'):
         self.heap = []
+        self.index = {}
+        self.size = 0
+        if tie == 'fifo':
+            self.tie, self.counter = None, itertools.count()
+        elif tie == 'lifo':
+            self.tie, self.counter = None, itertools.count(0, -1)
+        elif callable(tie):
+            self.tie, self.counter = tie, itertools.count()
+        else:
+            raise ValueError("Tie must be 'fifo', 'lifo' or a function.")
         if order == 'min':
             self.f = f
         elif order == 'max':  # now item with max f(x)
@@ -737,7 +757,11 @@ class PriorityQueue:
 
     def append(self, item):
         """Insert item at its correct position."""
-        heapq.heappush(self.heap, (self.f(item), item))
+        tie = self.tie(item) if self.tie else 0
+        entry = [self.f(item), tie, next(self.counter), item, True]
+        heapq.heappush(self.heap, entry)
+        self.index.setdefault(item, []).append(entry)
+        self.size += 1
 
     def extend(self, items):
         """Insert each item in items at its correct position."""
@@ -747,34 +771,47 @@ class PriorityQueue:
     def pop(self):
         """Pop and return the item (with min or max f(x) value)
         depending on the order."""
-        if self.heap:
-            return heapq.heappop(self.heap)[1]
-        else:
-            raise Exception('Trying to pop from empty PriorityQueue.')
+        while self.heap:
+            entry = heapq.heappop(self.heap)
+            if entry[4]:
+                self._unindex(entry)
+                return entry[3]
+        raise Exception('Trying to pop from empty PriorityQueue.')
+
+    def _unindex(self, entry):
+        entries = self.index[entry[3]]
+        for i, other in enumerate(entries):
+            if other is entry:
+                del entries[i]
+                break
+        if not entries:
+            del self.index[entry[3]]
+        self.size -= 1
 
     def __len__(self):
         """Return current capacity of PriorityQueue."""
-        return len(self.heap)
+        return self.size
 
     def __contains__(self, key):
         """Return True if the key is in PriorityQueue."""
-        return any([item == key for _, item in self.heap])
+        return key in self.index
 
     def __getitem__(self, key):
         """Returns the first value associated with key in PriorityQueue.
         Raises KeyError if key is not present."""
-        for value, item in self.heap:
-            if item == key:
-                return value
-        raise KeyError(str(key) + " is not in the priority queue")
+        try:
+            return self.index[key][0][0]
+        except KeyError:
+            raise KeyError(str(key) + " is not in the priority queue")
 
     def __delitem__(self, key):
         """Delete the first occurrence of key."""
         try:
-            del self.heap[[item == key for _, item in self.heap].index(True)]
-        except ValueError:
+            entry = self.index[key][0]
+        except KeyError:
             raise KeyError(str(key) + " is not in the priority queue")
-        heapq.heapify(self.heap)
+        entry[4] = False
+        self._unindex(entry)
 
 
 # ______________________________________________________________________________